@@ -0,0 +1,152 @@
+"""
+Asyncio HTTP client for the Patent Downloader
+aiohttp counterpart of HttpClient, used by the asyncio engine; same rate limiter and page cache
+"""
+
+import asyncio
+import codecs
+import functools
+from contextlib import asynccontextmanager
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from http_client import DEFAULT_HEADERS, DEFAULT_TIMEOUTS, DEFAULT_TIMEOUT, STREAM_CHUNK_SIZE, StopWhenReader, host_of
+from pdf_transfer import current_deadline
+
+
+def require_aiohttp():
+    """Raise a clear error if aiohttp isn't installed"""
+    if aiohttp is None:
+        raise RuntimeError("The asyncio engine needs aiohttp: pip install aiohttp")
+
+
+class AsyncHttpClient:
+    """One aiohttp session shared by every coroutine
+
+    The session must be opened on the event loop that will use it, so call
+    open() from the engine's startup hook and close() from its shutdown hook.
+    Page cache reads and writes (SQLite, zlib, files) run in executor, or the
+    loop's default executor, so they never block the loop.
+    """
+
+    def __init__(self, concurrency=100, headers=None, timeouts=None, rate_limiter=None, cache=None, executor=None):
+        require_aiohttp()
+        self.concurrency = max(1, int(concurrency))
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.executor = executor
+        self.headers = dict(DEFAULT_HEADERS)
+        self.headers.pop('Connection', None)  # aiohttp manages keep-alive itself
+        if headers:
+            self.headers.update(headers)
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.session = None
+
+    async def open(self):
+        """Create the session and its connection pool"""
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+
+    def timeout_for(self, url):
+        """Return the aiohttp timeout for the URL's host (read = max gap between chunks)
+
+        Inside a patent_deadline() block the whole request, body included, must
+        also finish before the deadline.
+        """
+        connect, read = self.timeouts.get(host_of(url), DEFAULT_TIMEOUT)
+        deadline = current_deadline()
+        if deadline:
+            deadline.check()
+            return aiohttp.ClientTimeout(total=max(0.1, deadline.remaining()), sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+    async def _blocking(self, func, *args, **kwargs):
+        """Run a blocking cache call in the executor"""
+        call = functools.partial(func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def throttle(self, host):
+        """Wait for the host's rate budget without blocking the loop"""
+        if self.rate_limiter:
+            wait = self.rate_limiter.bucket(host).reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def get(self, url, headers=None):
+        """GET a URL, yielding the response; the body is released on exit
+
+        Like HttpClient.get, waits for the host's rate budget first and feeds
+        the status (or a network error) back into the rate limiter.
+        """
+        host = host_of(url)
+        await self.throttle(host)
+        try:
+            response = await self.session.get(url, headers=headers, timeout=self.timeout_for(url))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if self.rate_limiter:
+                self.rate_limiter.record(host, None)
+            raise
+        if self.rate_limiter:
+            self.rate_limiter.record(host, response.status, response.headers.get('Retry-After'))
+        try:
+            yield response
+        finally:
+            response.release()
+
+    async def get_text(self, url, use_cache=True, stop_when=None):
+        """GET a page and return its decoded text, going through the response cache
+
+        Same contract as HttpClient.get_text, including stop_when streaming.
+        HTTP errors raise aiohttp.ClientResponseError.
+        """
+        cache = self.cache if use_cache else None
+        cached = await self._blocking(cache.lookup, url) if cache else None
+        if cached and cached.partial:
+            if stop_when is None or not stop_when(cached.body.decode('utf-8')):
+                cached = None
+        if cached and cached.fresh:
+            return cached.body.decode('utf-8')
+
+        request_headers = cache.conditional_headers(cached) if cached else None
+        async with self.get(url, headers=request_headers) as response:
+            if cached and response.status == 304:
+                await self._blocking(cache.mark_revalidated, url)
+                return cached.body.decode('utf-8')
+            response.raise_for_status()
+
+            if stop_when is None:
+                text, partial = await response.text(errors='replace'), False
+            else:
+                text, partial = await self._read_until(response, stop_when)
+                if partial:
+                    response.close()  # Drop the connection rather than read the rest of the page
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+        if cache:
+            await self._blocking(cache.store, url, text.encode('utf-8'),
+                                 etag=etag, last_modified=last_modified, partial=partial)
+        return text
+
+    @staticmethod
+    async def _read_until(response, stop_when):
+        """Decode a streamed body chunk by chunk until stop_when(text) is satisfied"""
+        decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+        reader = StopWhenReader(stop_when)
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            if reader.feed(decoder.decode(chunk)):
+                return reader.text(), True
+        reader.feed(decoder.decode(b'', final=True))
+        return reader.text(), False
+
+    async def close(self):
+        """Close the session and its pooled connections"""
+        if self.session:
+            await self.session.close()
+            self.session = None
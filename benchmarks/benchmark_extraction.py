@@ -0,0 +1,127 @@
+"""
+Benchmark patent metadata extraction
+Compares the fast head scan with full BeautifulSoup parsing (html.parser, and lxml if installed)
+
+Usage:
+    python benchmarks/benchmark_extraction.py                 # synthetic Google Patents-like pages
+    python benchmarks/benchmark_extraction.py page1.html ...  # saved detail pages
+
+For each page it also prints where a streamed download would be cut off
+(has_required_fields); "never" means the whole page is downloaded.
+"""
+
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import patent_parser  # noqa: E402
+
+
+def synthetic_page(patent_number, paragraphs, layout='google'):
+    """Build a page shaped like a Google Patents detail page with a long description
+
+    layout 'google' lists people the way patents.google.com does (<dt>
+    labels, <dd itemprop="assigneeCurrent">); 'itemprop' uses a plain
+    itemprop="assignee".
+    """
+    head = (
+        '<!DOCTYPE html><html lang="en"><head>'
+        f'<title>{patent_number} - Widget assembly - Google Patents</title>'
+        f'<meta name="DC.title" content="{patent_number} - Widget assembly - Google Patents">'
+        '<meta name="DC.date" content="2019-03-14" scheme="dateSubmitted">'
+        '<meta name="DC.date" content="2021-06-01" scheme="issued">'
+        f'<meta name="citation_pdf_url" content="https://patentimages.storage.googleapis.com/ab/cd/{patent_number}.pdf">'
+        '</head><body>'
+    )
+    top = (
+        f'<h1 id="title">{patent_number} - Widget assembly</h1>'
+        + (
+            '<dl class="important-people"><dt>Inventor</dt><dd itemprop="inventor" repeat>Jane Roe</dd>'
+            '<dt>Current Assignee</dt>\n<dd itemprop="assigneeCurrent" repeat>\n  Example &amp; Co\n</dd>'
+            '<dt>Original Assignee</dt><dd itemprop="assigneeOriginal" repeat>Example Holdings</dd></dl>'
+            if layout == 'google' else
+            '<dl><dt>Current Assignee</dt><dd itemprop="assignee">Example &amp; Co</dd></dl>'
+        ) +
+        f'<a href="https://patentimages.storage.googleapis.com/ab/cd/{patent_number}.pdf">Download PDF</a>'
+    )
+    description = ''.join(
+        f'<div class="description-paragraph" num="{i}">Paragraph {i}: the widget comprises a frame, '
+        'a spindle and a plurality of fasteners arranged about the spindle axis.</div>'
+        for i in range(paragraphs)
+    )
+    citations = ''.join(
+        f'<tr itemprop="backwardReferences"><td><span itemprop="publicationNumber">US{7000000 + i}B2</span></td>'
+        f'<td><time itemprop="publicationDate">2010-01-01</time></td><td>Cited widget {i}</td></tr>'
+        for i in range(paragraphs // 4)
+    )
+    return head + top + description + '<table>' + citations + '</table></body></html>'
+
+
+def cutoff(html_content, step=16 * 1024):
+    """Bytes a streamed page download would read before has_required_fields stops it, or None"""
+    for end in range(step, len(html_content) + step, step):
+        if patent_parser.has_required_fields(html_content[:end]):
+            return min(end, len(html_content))
+    return None
+
+
+def measure(func, patent_number, html_content, repeats):
+    """Return (median seconds, peak traced bytes, result) for one extraction method"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(patent_number, html_content)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(patent_number, html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def main(paths):
+    methods = [
+        ('fast scan', patent_parser.extract_fast),
+        ('soup html.parser', lambda n, h: patent_parser.extract_with_soup(n, h, 'html.parser')),
+    ]
+    if patent_parser.SOUP_PARSER == 'lxml':
+        methods.append(('soup lxml', lambda n, h: patent_parser.extract_with_soup(n, h, 'lxml')))
+
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                pages.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    else:
+        pages = [(f'US{9000000 + n}B2', synthetic_page(f'US{9000000 + n}B2', n, layout))
+                 for layout in ('google', 'itemprop') for n in (200, 2000, 8000)]
+
+    print(f"{'page':<16}{'size':>10}  {'method':<18}{'time/page':>12}{'peak mem':>12}")
+    print('-' * 70)
+    for patent_number, html_content in pages:
+        size_kb = len(html_content.encode('utf-8')) / 1024
+        repeats = 20 if size_kb < 500 else 5
+        results = []
+        for name, func in methods:
+            seconds, peak, result = measure(func, patent_number, html_content, repeats)
+            results.append(result)
+            print(f"{patent_number:<16}{size_kb:>8.0f}KB  {name:<18}{seconds * 1000:>10.2f}ms"
+                  f"{peak / 1024:>10.0f}KB")
+        fast, full = results[0], results[1]
+        if fast is None:
+            print(f"{'':<28}fast scan fell back to the full parser for this page")
+        else:
+            same = all(fast[k] == full[k] for k in fast if k != 'Download Date')
+            print(f"{'':<28}fast scan matches full parser: {same}")
+        cut = cutoff(html_content)
+        print(f"{'':<28}streamed download cut off at: "
+              f"{'never' if cut is None else f'{cut / 1024:.0f}KB of {size_kb:.0f}KB'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
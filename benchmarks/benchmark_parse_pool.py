@@ -0,0 +1,56 @@
+"""
+Benchmark full-page parsing throughput: worker threads vs. worker processes
+Shows how extract_compressed scales with the process count (threads are held back by the GIL)
+
+Usage:
+    python benchmarks/benchmark_parse_pool.py              # 200 synthetic ~400 KB pages
+    python benchmarks/benchmark_parse_pool.py 500 1 2 4 8  # page count, then process counts to try
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import patent_parser  # noqa: E402
+from benchmark_extraction import synthetic_page  # noqa: E402
+
+
+def throughput(executor, jobs):
+    """Pages per second for parsing every job on the executor"""
+    start = time.perf_counter()
+    futures = [executor.submit(patent_parser.extract_compressed, number, data) for number, data in jobs]
+    for future in futures:
+        future.result()
+    return len(jobs) / (time.perf_counter() - start)
+
+
+def main(args):
+    page_count = int(args[0]) if args else 200
+    counts = [int(n) for n in args[1:]] or sorted({1, 2, 4, os.cpu_count() or 1})
+
+    # A handful of distinct pages, compressed once like the downloader does
+    pages = [(f'US{9000000 + n}B2', patent_parser.compress_page(synthetic_page(f'US{9000000 + n}B2', 2000)))
+             for n in range(8)]
+    jobs = [pages[i % len(pages)] for i in range(page_count)]
+    raw_kb = len(synthetic_page('US9000000B2', 2000).encode('utf-8')) / 1024
+    packed_kb = len(pages[0][1]) / 1024
+    print(f"{page_count} pages, {raw_kb:.0f} KB each ({packed_kb:.0f} KB compressed), {os.cpu_count()} CPU(s)")
+    print(f"{'executor':<22}{'pages/s':>10}{'speedup':>10}")
+    print('-' * 42)
+
+    baseline = None
+    for kind, executor_class in (('threads', ThreadPoolExecutor), ('processes', ProcessPoolExecutor)):
+        for count in counts:
+            with executor_class(max_workers=count) as executor:
+                throughput(executor, jobs[:count])  # Warm up (process start-up, imports)
+                rate = throughput(executor, jobs)
+            baseline = baseline or rate
+            print(f"{count:>3} {kind:<18}{rate:>10.1f}{rate / baseline:>9.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,104 @@
+"""
+Benchmark per-file CPU cost of streaming a PDF to disk
+Compares the old iter_content(8192) loop with PdfFileWriter + adaptive readinto chunks
+
+Usage:
+    python benchmarks/benchmark_pdf_streaming.py          # 20 downloads of an 8 MB PDF
+    python benchmarks/benchmark_pdf_streaming.py 50 16    # download count, PDF size in MB
+"""
+
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_transfer import PdfFileWriter, expected_length, iter_response_chunks  # noqa: E402
+
+
+def synthetic_pdf(size):
+    """Bytes that pass the %PDF header / %%EOF trailer checks"""
+    head, tail = b'%PDF-1.7\n', b'\n%%EOF\n'
+    return head + os.urandom(size - len(head) - len(tail)) + tail
+
+
+def serve(body):
+    """Serve body for every GET on a local port; returns (server, url)"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/patent.pdf"
+
+
+def old_loop(response, path):
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+
+
+def new_loop(response, path):
+    with PdfFileWriter(path, expected_length(response.headers)) as f:
+        for chunk in iter_response_chunks(response):
+            f.write(chunk)
+
+
+def measure(session, url, path, save, count):
+    """Client-thread CPU seconds and wall seconds per download"""
+    cpu, wall = [], []
+    for _ in range(count):
+        with session.get(url, stream=True) as response:
+            response.raise_for_status()
+            cpu_start, wall_start = time.thread_time(), time.perf_counter()
+            save(response, path)
+            cpu.append(time.thread_time() - cpu_start)
+            wall.append(time.perf_counter() - wall_start)
+    return statistics.median(cpu), statistics.median(wall)
+
+
+def main(args):
+    count = int(args[0]) if args else 20
+    size_mb = float(args[1]) if len(args) > 1 else 8
+    body = synthetic_pdf(int(size_mb * 1024 * 1024))
+    server, url = serve(body)
+    workdir = tempfile.mkdtemp(prefix='pdf-bench-')
+    path = os.path.join(workdir, 'US1234567B2.pdf')
+    try:
+        with requests.Session() as session:
+            measure(session, url, path, old_loop, 2)  # Warm up the connection and page cache
+            print(f"{count} downloads of a {size_mb:g} MB PDF from localhost (median per file)")
+            print(f"{'writer':<34}{'CPU ms':>10}{'wall ms':>10}")
+            print('-' * 54)
+            baseline = None
+            for name, save in (('iter_content(8192) + open()', old_loop),
+                               ('PdfFileWriter + adaptive readinto', new_loop)):
+                cpu, wall = measure(session, url, path, save, count)
+                note = f"   {baseline / cpu:.1f}x less CPU" if baseline else ""
+                baseline = baseline or cpu
+                print(f"{name:<34}{cpu * 1000:>10.1f}{wall * 1000:>10.1f}{note}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
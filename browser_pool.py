@@ -0,0 +1,216 @@
+"""
+Headless Chrome pool for the Patent Downloader
+A bounded set of reusable browsers, started on first use and recycled after a number of pages or on memory growth
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+from pdf_transfer import current_deadline
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_BROWSERS = 1           # Browsers running at the same time
+DEFAULT_PAGES_PER_BROWSER = 50  # Restart a browser after rendering this many pages...
+DEFAULT_MAX_MEMORY_GROWTH = 300 * 1024 * 1024  # ...or once it has grown this much since its first page
+PAGE_LOAD_TIMEOUT = 60.0       # Seconds for driver.get(), shortened to the patent's remaining budget
+ACQUIRE_POLL_INTERVAL = 0.5    # How often a waiting worker checks its deadline and close()
+
+# Network.setBlockedURLs patterns ('*' matches anything) for what a printed patent page doesn't need
+TRACKER_URLS = (
+    '*google-analytics.com/*', '*googletagmanager.com/*', '*doubleclick.net/*', '*googlesyndication.com/*',
+    '*googleadservices.com/*', '*/gen_204*', '*play.google.com/log*', '*/csi?*',
+)
+FONT_URLS = ('*fonts.googleapis.com/*', '*fonts.gstatic.com/*', '*.woff*', '*.ttf*', '*.otf*', '*.eot*')
+MEDIA_URLS = ('*.mp4*', '*.webm*', '*.m3u8*', '*youtube.com/embed/*')
+IMAGE_URLS = ('*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.tif*')
+
+BLOCK_PROFILES = {
+    'off': (),                                              # Load everything
+    'trackers': TRACKER_URLS,                               # Analytics and ads only
+    'drawings': TRACKER_URLS + FONT_URLS + MEDIA_URLS,      # Keep images, so drawings are printed
+    'minimal': TRACKER_URLS + FONT_URLS + MEDIA_URLS + IMAGE_URLS,  # Text only
+}
+DEFAULT_BLOCK_PROFILE = 'minimal'
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolClosed(RuntimeError):
+    """The pool was closed (the run ended or was stopped)"""
+
+
+def browser_memory(driver):
+    """Bytes used by a browser, or None if it can't be measured
+
+    With psutil this is the resident memory of every process chromedriver
+    started (browser, renderers, GPU); otherwise the JavaScript heap of the
+    current page, which is what grows when pages leak.
+    """
+    if psutil is not None:
+        try:
+            service = psutil.Process(driver.service.process.pid)
+            return sum(p.memory_info().rss for p in service.children(recursive=True))
+        except (AttributeError, psutil.Error):
+            pass
+    try:
+        return int(driver.execute_cdp_cmd('Runtime.getHeapUsage', {})['usedSize'])
+    except Exception:
+        return None
+
+
+def blocked_urls(profile=DEFAULT_BLOCK_PROFILE, extra=(), allow=()):
+    """URL patterns to block: the profile's, plus extra, minus any pattern listed in allow"""
+    if profile not in BLOCK_PROFILES:
+        raise ValueError(f"Unknown block profile {profile!r} (choose from {', '.join(BLOCK_PROFILES)})")
+    patterns = [p for p in BLOCK_PROFILES[profile] + tuple(extra) if p not in set(allow)]
+    return list(dict.fromkeys(patterns))
+
+
+def block_requests(driver, patterns):
+    """Make Chrome fail requests to URLs matching patterns before they are sent
+
+    Set once per browser; it holds for every page the tab loads afterwards.
+    """
+    if not patterns:
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+
+
+class BrowserWorker:
+    """One Chrome instance and what it has done since it started"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.baseline = None  # Memory after the first page
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+
+
+class BrowserPool:
+    """Lends out at most size browsers; start_browser() is only called when one is needed
+
+    A browser goes back to the pool after each page and is reused by the
+    next patent that needs rendering. It is shut down instead after
+    max_pages pages, once its memory has grown by max_memory_growth bytes
+    since its first page, or if the page failed (it may be wedged); the
+    next browser() call starts a fresh one. close() quits idle browsers at once
+    and busy ones as soon as they are handed back.
+    """
+
+    def __init__(self, start_browser, size=DEFAULT_BROWSERS, max_pages=DEFAULT_PAGES_PER_BROWSER,
+                 max_memory_growth=DEFAULT_MAX_MEMORY_GROWTH, log=None):
+        self.start_browser = start_browser
+        self.size = max(1, int(size))
+        self.max_pages = max_pages
+        self.max_memory_growth = max_memory_growth
+        self.log = log or logger.info
+        self._idle = []
+        self._running = 0  # Idle + lent out
+        self._closed = False
+        self._condition = threading.Condition()
+        self.started = 0
+        self.recycled = 0
+        self.pages = 0
+
+    @contextmanager
+    def browser(self):
+        """Borrow a WebDriver for one page
+
+        Waits while all browsers are busy, up to the current patent's
+        deadline. Raises BrowserPoolClosed after close().
+        """
+        worker = self._acquire()
+        ok = False
+        try:
+            yield worker.driver
+            ok = True
+        finally:
+            self._release(worker, ok)
+
+    def _acquire(self):
+        deadline = current_deadline()
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise BrowserPoolClosed("browser pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._running < self.size:
+                    self._running += 1
+                    break
+                if deadline:
+                    deadline.check()
+                self._condition.wait(ACQUIRE_POLL_INTERVAL)
+        # Start outside the lock - it takes seconds and other workers may have idle browsers to return
+        try:
+            worker = BrowserWorker(self.start_browser())
+        except BaseException:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.started += 1
+        self.log(f"Browser started ({self._running} of {self.size})")
+        return worker
+
+    def _release(self, worker, ok):
+        worker.pages += 1
+        reason = None if ok else "page failed"
+        if ok:
+            reason = self._recycle_reason(worker)
+        with self._condition:
+            self.pages += 1
+            keep = reason is None and not self._closed
+            if keep:
+                self._idle.append(worker)
+            else:
+                self._running -= 1
+                if reason:
+                    self.recycled += 1
+            self._condition.notify()
+        if not keep:
+            if reason:
+                self.log(f"Restarting browser ({reason})")
+            worker.quit()
+
+    def _recycle_reason(self, worker):
+        """Why a browser should be replaced after its latest page, or None to keep it"""
+        if self.max_pages and worker.pages >= self.max_pages:
+            return f"{worker.pages} pages rendered"
+        if not self.max_memory_growth:
+            return None
+        memory = browser_memory(worker.driver)
+        if memory is None:
+            return None
+        if worker.baseline is None:
+            worker.baseline = memory
+        elif memory - worker.baseline > self.max_memory_growth:
+            return f"memory grew by {(memory - worker.baseline) // (1024 * 1024)} MB"
+        return None
+
+    def close(self):
+        """Quit idle browsers and refuse new requests; busy ones quit when handed back"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._running -= len(idle)
+            self._condition.notify_all()
+        for worker in idle:
+            worker.quit()
+
+    def stats(self):
+        """Counts for the run log"""
+        with self._condition:
+            return {'started': self.started, 'recycled': self.recycled, 'pages': self.pages}
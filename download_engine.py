@@ -0,0 +1,362 @@
+"""
+Concurrent download engines for the Patent Downloader
+Runs a per-patent task on a bounded pool of workers and reports results in completion order
+"""
+
+import asyncio
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_WORKERS = 4
+MAX_WORKERS = 32
+
+# Coroutines are cheap, so the asyncio engine keeps far more requests in flight
+DEFAULT_ASYNC_CONCURRENCY = 100
+MAX_ASYNC_CONCURRENCY = 500
+
+# One finished work item: position in the input (1-based), the input value,
+# the task's return value and the exception it raised (if any)
+DownloadResult = namedtuple('DownloadResult', ['index', 'item', 'value', 'error'])
+
+# Returned by a worker that picked up an item after stop() was requested
+_CANCELLED = object()
+
+# One step of a staged pipeline: func(payload) -> payload for the next stage
+# (or the item's final value after the last stage), run on `workers` threads
+Stage = namedtuple('Stage', ['name', 'func', 'workers'])
+
+
+class Finished:
+    """Returned by a pipeline stage to end an item early with a final value"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class ThreadedDownloadEngine:
+    """Run a task for every item on a bounded thread pool
+
+    Only ``max_workers * queue_factor`` items are ever submitted at once, so the
+    input can be a lazy iterator and stopping only has to cancel a small window
+    of queued work instead of the whole list.
+    """
+
+    name = 'threaded'
+    is_async = False  # True if task must be a coroutine function
+    is_staged = False
+    default_workers = DEFAULT_WORKERS
+    worker_limit = MAX_WORKERS
+
+    def __init__(self, task, max_workers=DEFAULT_WORKERS, queue_factor=2):
+        self.task = task
+        self.max_workers = max(1, min(int(max_workers), self.worker_limit))
+        self.queue_factor = max(1, int(queue_factor))
+        self._stop_event = threading.Event()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @property
+    def stopped(self):
+        """True once stop() has been requested"""
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """Stop dispatching new items and cancel everything still queued"""
+        self._stop_event.set()
+        with self._lock:
+            for future in list(self._pending):
+                future.cancel()
+
+    def run(self, items, on_submit=None):
+        """Run the task over items, yielding a DownloadResult as each one completes
+
+        on_submit(index, item) is called from the calling thread just before an
+        item is handed to the pool.
+        """
+        window = self.max_workers * self.queue_factor
+        iterator = enumerate(items, 1)
+        futures = {}
+
+        self._start()
+        try:
+            exhausted = False
+            while True:
+                # Top up the window of in-flight work
+                while not exhausted and not self.stopped and len(futures) < window:
+                    try:
+                        index, item = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if on_submit:
+                        on_submit(index, item)
+                    future = self._submit(item)
+                    futures[future] = (index, item)
+                    with self._lock:
+                        self._pending.add(future)
+
+                if not futures:
+                    break
+
+                done, _ = wait(list(futures), timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item = futures.pop(future)
+                    with self._lock:
+                        self._pending.discard(future)
+                    if future.cancelled():
+                        continue
+                    value, error = future.result()
+                    if value is _CANCELLED:
+                        continue
+                    yield DownloadResult(index, item, value, error)
+        finally:
+            # Generator closed early or stop requested - drop queued work
+            for future in futures:
+                future.cancel()
+            with self._lock:
+                self._pending.clear()
+            self._shutdown()
+
+    def _start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='patent-worker')
+
+    def _submit(self, item):
+        """Hand one item to the workers, returning a concurrent.futures.Future"""
+        return self._executor.submit(self._run_task, item)
+
+    def _shutdown(self):
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _run_task(self, item):
+        """Run the task for one item, capturing its exception instead of raising"""
+        if self.stopped:
+            return _CANCELLED, None
+        try:
+            return self.task(item), None
+        except Exception as e:
+            return None, e
+
+
+class AsyncDownloadEngine(ThreadedDownloadEngine):
+    """Run a coroutine task for every item on an asyncio event loop
+
+    The loop runs in its own thread, so run() is the same blocking generator as
+    the threaded engine's and callers don't need to be async themselves. Every
+    submitted item is in flight at once; max_workers is the number of concurrent
+    coroutines, not threads. startup()/shutdown() coroutines run on the loop
+    before the first and after the last item (e.g. to open an aiohttp session).
+    """
+
+    name = 'asyncio'
+    is_async = True
+    default_workers = DEFAULT_ASYNC_CONCURRENCY
+    worker_limit = MAX_ASYNC_CONCURRENCY
+
+    def __init__(self, task, max_workers=DEFAULT_ASYNC_CONCURRENCY, queue_factor=1, startup=None, shutdown=None):
+        super().__init__(task, max_workers=max_workers, queue_factor=queue_factor)
+        self.startup = startup
+        self.shutdown = shutdown
+        self.loop = None
+        self._thread = None
+
+    def _start(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='patent-event-loop', daemon=True)
+        self._thread.start()
+        if self.startup:
+            try:
+                asyncio.run_coroutine_threadsafe(self.startup(), self.loop).result()
+            except BaseException:
+                self._stop_loop()
+                raise
+
+    def _submit(self, item):
+        return asyncio.run_coroutine_threadsafe(self._run_task(item), self.loop)
+
+    def _shutdown(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), self.loop).result()
+        finally:
+            self._stop_loop()
+
+    async def _drain(self):
+        """Let cancelled tasks unwind, then run the shutdown hook"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.shutdown:
+            await self.shutdown()
+
+    def _stop_loop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    async def _run_task(self, item):
+        if self.stopped:
+            return _CANCELLED, None
+        try:
+            return await self.task(item), None
+        except Exception as e:
+            return None, e
+
+
+class PipelineDownloadEngine:
+    """Run every item through a chain of stages, each with its own thread pool
+
+    Stages are joined by bounded queues, so a slow stage only backs up the
+    stages in front of it once its queue is full; until then the earlier
+    stages keep working ahead on upcoming items. A stage can end an item early
+    by returning Finished(value). Results are yielded in completion order, as
+    with the other engines.
+    """
+
+    name = 'pipeline'
+    is_async = False
+    is_staged = True  # Built from a list of Stage instead of a single task
+    default_workers = DEFAULT_WORKERS
+    worker_limit = MAX_WORKERS
+
+    def __init__(self, stages, queue_factor=2):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = [stage._replace(workers=max(1, min(int(stage.workers), self.worker_limit)))
+                       for stage in stages]
+        self.queue_factor = max(1, int(queue_factor))
+        self._stop_event = threading.Event()
+
+    @property
+    def max_workers(self):
+        """Total worker threads over all stages"""
+        return sum(stage.workers for stage in self.stages)
+
+    @property
+    def stopped(self):
+        """True once stop() has been requested"""
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """Stop feeding new items; items inside the pipeline are dropped at their next stage (except the last)"""
+        self._stop_event.set()
+
+    def describe(self):
+        """e.g. 'fetch x4 -> parse x2 -> pdf x4'"""
+        return ' -> '.join(f"{stage.name} x{stage.workers}" for stage in self.stages)
+
+    def run(self, items, on_submit=None):
+        """Run items through the stages, yielding a DownloadResult as each one leaves the pipeline
+
+        on_submit(index, item) is called from the calling thread just before an
+        item enters the first stage.
+        """
+        # The first queue is only bounded by the in-flight window; the rest
+        # hold a couple of items per downstream worker
+        queues = [queue.Queue()]
+        for stage in self.stages[1:]:
+            queues.append(queue.Queue(maxsize=stage.workers * self.queue_factor))
+        results = queue.Queue()
+        window = sum((stage.workers * (self.queue_factor + 1) for stage in self.stages))
+
+        stage_threads = []
+        for position, stage in enumerate(self.stages):
+            out = queues[position + 1] if position + 1 < len(queues) else None
+            threads = [
+                threading.Thread(target=self._stage_worker, args=(stage, queues[position], out, results),
+                                 name=f'patent-{stage.name}-{n + 1}', daemon=True)
+                for n in range(stage.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            stage_threads.append(threads)
+
+        iterator = enumerate(items, 1)
+        in_flight = 0
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and not self.stopped and in_flight < window:
+                    try:
+                        index, item = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if on_submit:
+                        on_submit(index, item)
+                    queues[0].put((index, item, item))
+                    in_flight += 1
+
+                if not in_flight:
+                    break
+
+                try:
+                    index, item, value, error = results.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                in_flight -= 1
+                if value is _CANCELLED:
+                    continue
+                yield DownloadResult(index, item, value, error)
+        finally:
+            # Generator closed early - let what's still inside drain as cancelled
+            if in_flight:
+                self._stop_event.set()
+            # Shut stages down front to back, so nothing is handed to a stage that has exited
+            for inbox, threads in zip(queues, stage_threads):
+                for _ in threads:
+                    inbox.put(None)
+                for thread in threads:
+                    thread.join()
+
+    def _stage_worker(self, stage, inbox, outbox, results):
+        """Take payloads from inbox, run the stage and pass them on (None = shut down)"""
+        while True:
+            job = inbox.get()
+            if job is None:
+                return
+            index, item, payload = job
+            # The last stage only records work already done, so it still runs after stop()
+            if self.stopped and outbox is not None:
+                results.put((index, item, _CANCELLED, None))
+                continue
+            try:
+                payload = stage.func(payload)
+            except Exception as e:
+                results.put((index, item, None, e))
+                continue
+            if isinstance(payload, Finished):
+                results.put((index, item, payload.value, None))
+            elif outbox is None:
+                results.put((index, item, payload, None))
+            else:
+                outbox.put((index, item, payload))
+
+
+ENGINES = {
+    ThreadedDownloadEngine.name: ThreadedDownloadEngine,
+    AsyncDownloadEngine.name: AsyncDownloadEngine,
+    PipelineDownloadEngine.name: PipelineDownloadEngine,
+}
+
+
+def engine_class_for(mode):
+    """Look up an engine class by name"""
+    try:
+        return ENGINES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown engine mode '{mode}'. Available: {', '.join(sorted(ENGINES))}")
+
+
+def create_engine(task, mode='threaded', max_workers=None, **kwargs):
+    """Create a download engine by name
+
+    task is the per-item callable (a coroutine function for async engines,
+    a list of Stage for staged ones). max_workers None = the engine's default.
+    """
+    engine_class = engine_class_for(mode)
+    if max_workers is not None:
+        kwargs['max_workers'] = max_workers
+    return engine_class(task, **kwargs)
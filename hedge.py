@@ -0,0 +1,57 @@
+"""
+Hedged source fetching for the Patent Downloader
+Tracks Google Patents latency so FreePatentsOnline can be raced against slow downloads
+"""
+
+import math
+import threading
+from collections import Counter, deque
+
+DEFAULT_HEDGE_QUANTILE = 0.95  # Hedge once Google is slower than this share of recent downloads
+DEFAULT_HEDGE_DELAY = 8.0      # Seconds, used until enough downloads have been timed
+MIN_HEDGE_DELAY = 1.0          # Never hedge sooner than this, however fast Google has been
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200           # Recent downloads the quantile is taken over
+
+SOURCE_GOOGLE = 'google'
+SOURCE_FPO = 'fpo'
+
+
+class HedgeCancelled(Exception):
+    """The other source already delivered the PDF"""
+
+
+class LatencyTracker:
+    """Rolling latency quantile of successful Google Patents downloads"""
+
+    def __init__(self, quantile=DEFAULT_HEDGE_QUANTILE, default=DEFAULT_HEDGE_DELAY,
+                 minimum=MIN_HEDGE_DELAY, window=LATENCY_WINDOW):
+        self.quantile = quantile
+        self.default = default
+        self.minimum = minimum
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = Counter()  # hedged, google_won, fpo_won
+
+    def record(self, seconds):
+        """Add one page + PDF download time"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def threshold(self):
+        """Seconds to give Google before starting FreePatentsOnline as well"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_SAMPLES:
+            return self.default
+        index = min(len(samples) - 1, math.ceil(self.quantile * len(samples)) - 1)
+        return max(self.minimum, samples[index])
+
+    def count(self, event):
+        """Count a hedging event for the run summary"""
+        with self._lock:
+            self.stats[event] += 1
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,202 @@
+"""
+Shared HTTP client for the Patent Downloader
+One pooled keep-alive session for Google Patents, patentimages and FreePatentsOnline
+"""
+
+import codecs
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pdf_transfer import current_deadline
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+)
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+GOOGLE_PATENTS_HOST = 'patents.google.com'
+PATENT_IMAGES_HOST = 'patentimages.storage.googleapis.com'
+FPO_HOST = 'www.freepatentsonline.com'
+
+# (connect, read) timeouts in seconds per host
+DEFAULT_TIMEOUTS = {
+    GOOGLE_PATENTS_HOST: (5, 10),
+    PATENT_IMAGES_HOST: (5, 30),
+    FPO_HOST: (5, 15),
+}
+DEFAULT_TIMEOUT = (5, 15)
+
+# Bytes read per step when streaming a page until the needed fields are found
+STREAM_CHUNK_SIZE = 32 * 1024
+STOP_WHEN_WINDOW = 256 * 1024  # Characters of a streamed page checked for an early stop
+
+
+def host_of(url):
+    """Return the lower-case host name of a URL"""
+    return (urlsplit(url).hostname or '').lower()
+
+
+class StopWhenReader:
+    """Collects decoded chunks and asks stop_when(text so far) whether the rest can be skipped
+
+    stop_when rescans everything read so far, so it is only asked while the
+    text is within STOP_WHEN_WINDOW; a page that hasn't shown its fields by
+    then is read to the end without further checks. Chunks are kept in a
+    list and joined once instead of being appended to one growing string.
+    """
+
+    def __init__(self, stop_when, window=STOP_WHEN_WINDOW):
+        self.stop_when = stop_when
+        self.window = window
+        self.parts = []
+        self.length = 0
+
+    def feed(self, text):
+        """Add a decoded chunk; True once stop_when is satisfied"""
+        if not text:
+            return False
+        self.parts.append(text)
+        if self.length >= self.window:
+            return False  # Past the window - already given up on an early stop
+        self.length += len(text)
+        return self.stop_when(self.text())
+
+    def text(self):
+        if len(self.parts) > 1:
+            self.parts = [''.join(self.parts)]
+        return self.parts[0] if self.parts else ''
+
+
+class HttpClient:
+    """Pooled requests session shared by all download workers
+
+    urllib3 keeps a separate connection pool per host, so each of the three
+    patent hosts gets up to ``pool_size`` kept-alive connections. Size the pool
+    to the worker count so no worker ever has to open a throwaway connection.
+    """
+
+    def __init__(self, pool_size=4, headers=None, timeouts=None, rate_limiter=None, cache=None):
+        self.pool_size = max(1, int(pool_size))
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(
+            pool_connections=len(self.timeouts) + 2,  # Number of per-host pools to keep
+            pool_maxsize=self.pool_size,              # Connections kept alive per host
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def timeout_for(self, url):
+        """Return the (connect, read) timeout configured for the URL's host"""
+        return self.timeouts.get(host_of(url), DEFAULT_TIMEOUT)
+
+    def get(self, url, stream=False, timeout=None, headers=None, **kwargs):
+        """GET a URL through the shared session
+
+        Streaming responses hold a pooled connection until they are consumed or
+        closed, so callers should use them as a context manager. When a rate
+        limiter is attached, the call waits for the host's budget first and the
+        response status is fed back so the host's rate can adapt. Inside a
+        patent_deadline() block the timeouts never reach past the deadline.
+        """
+        if timeout is None:
+            timeout = self.timeout_for(url)
+        deadline = current_deadline()
+        if deadline:
+            deadline.check()
+            timeout = deadline.cap(timeout)
+        host = host_of(url)
+        if self.rate_limiter:
+            self.rate_limiter.acquire(host)
+        try:
+            response = self.session.get(url, stream=stream, timeout=timeout, headers=headers, **kwargs)
+        except requests.RequestException:
+            if self.rate_limiter:
+                self.rate_limiter.record(host, None)
+            raise
+        if self.rate_limiter:
+            self.rate_limiter.record(host, response.status_code, response.headers.get('Retry-After'))
+        return response
+
+    def get_text(self, url, use_cache=True, stop_when=None):
+        """GET a page and return its decoded text, going through the response cache
+
+        Fresh cache entries are served from disk without a request; stale ones
+        are revalidated with If-None-Match / If-Modified-Since. HTTP errors raise
+        requests.HTTPError exactly as an uncached fetch would.
+
+        With stop_when(text_so_far) the body is streamed and the transfer is cut
+        off as soon as it returns True, so only the head of a large page is
+        downloaded. The text returned is then a prefix of the page.
+        """
+        cache = self.cache if use_cache else None
+        cached = cache.lookup(url) if cache else None
+        if cached and cached.partial:
+            # A cut-off body is only good for callers that need no more than it holds
+            if stop_when is None or not stop_when(cached.body.decode('utf-8')):
+                cached = None
+        if cached and cached.fresh:
+            return cached.body.decode('utf-8')
+
+        headers = cache.conditional_headers(cached) if cached else None
+        with self.get(url, headers=headers, stream=stop_when is not None) as response:
+            if cached and response.status_code == 304:
+                cache.mark_revalidated(url)
+                return cached.body.decode('utf-8')
+            response.raise_for_status()
+
+            if stop_when is None:
+                text, partial = response.text, False
+            else:
+                text, partial = self._read_until(response, stop_when)
+
+        if cache:
+            cache.store(url, text.encode('utf-8'),
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                        partial=partial)
+        return text
+
+    @staticmethod
+    def _read_until(response, stop_when):
+        """Decode a streamed body chunk by chunk until stop_when(text) is satisfied
+
+        Returns (text, partial). Closing a response before the body is fully read
+        drops its connection instead of returning it to the pool, which is far
+        cheaper than pulling megabytes of description and citations.
+        """
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        reader = StopWhenReader(stop_when)
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if reader.feed(decoder.decode(chunk)):
+                return reader.text(), True
+        reader.feed(decoder.decode(b'', final=True))
+        return reader.text(), False
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,101 @@
+"""
+Persistent job state for the Patent Downloader
+Records per-patent status in SQLite next to the downloads so an interrupted run can resume
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+JOB_STATE_FILENAME = 'job_state.sqlite3'
+
+STATUS_PENDING = 'pending'
+STATUS_FETCHED = 'fetched'        # Details fetched, no PDF wanted
+STATUS_DOWNLOADED = 'downloaded'  # PDF saved (and details fetched)
+STATUS_FAILED = 'failed'
+
+# Which stored statuses count as "done" for each download mode
+FINISHED_STATUSES = {
+    'download': (STATUS_DOWNLOADED,),
+    'fetch': (STATUS_FETCHED, STATUS_DOWNLOADED),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patents (
+    patent_key    TEXT PRIMARY KEY,
+    patent_number TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    reason        TEXT,
+    info          TEXT,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    updated_at    TEXT NOT NULL
+)
+"""
+
+
+class JobStateStore:
+    """SQLite-backed per-patent status store shared by all workers
+
+    WAL journaling with synchronous=NORMAL keeps every status change durable
+    across an app crash while costing no fsync per write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+
+    def finished_keys(self, mode='download'):
+        """Return the set of patent keys already finished for this mode (one query)"""
+        statuses = FINISHED_STATUSES.get(mode, FINISHED_STATUSES['download'])
+        placeholders = ','.join('?' * len(statuses))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT patent_key FROM patents WHERE status IN ({placeholders})', statuses
+            )
+            return {row[0] for row in rows}
+
+    def get_info(self, patent_key):
+        """Return the report row stored for a patent, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT info FROM patents WHERE patent_key = ?', (patent_key,)
+            ).fetchone()
+        if row and row[0]:
+            return json.loads(row[0])
+        return None
+
+    def record(self, patent_key, patent_number, status, reason=None, info=None):
+        """Insert or update a patent's status"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        info_json = json.dumps(info, ensure_ascii=False) if info is not None else None
+        attempt = 1 if status == STATUS_PENDING else 0
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO patents (patent_key, patent_number, status, reason, info, attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(patent_key) DO UPDATE SET
+                    patent_number = excluded.patent_number,
+                    status = excluded.status,
+                    reason = excluded.reason,
+                    info = COALESCE(excluded.info, patents.info),
+                    attempts = patents.attempts + excluded.attempts,
+                    updated_at = excluded.updated_at
+                """,
+                (patent_key, str(patent_number), status, reason, info_json, attempt, now)
+            )
+
+    def counts(self):
+        """Return {status: count} over the whole store"""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM patents GROUP BY status')
+            return dict(rows.fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
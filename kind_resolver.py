@@ -0,0 +1,144 @@
+"""
+Kind-code resolver for the Patent Downloader
+Tries likely kind-code variants when a patent page isn't found, and remembers which variant works per number pattern
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+from patent_numbers import clean_patent_number, split_patent_number
+from retry_policy import http_status
+
+KIND_CODES_FILENAME = 'kind_codes.json'
+
+# Variants to try per country, most common first
+DEFAULT_KIND_CODES = {
+    'US': ('B2', 'A1', 'B1', 'A', 'E', 'S'),
+    'EP': ('A1', 'B1', 'A2', 'B2'),
+    'WO': ('A1', 'A2', 'A3'),
+    'CN': ('A', 'B', 'U'),
+    'JP': ('A', 'B2'),
+    'KR': ('A', 'B1'),
+    'DE': ('A1', 'B4', 'C2', 'U1'),
+    'GB': ('A', 'B'),
+    'FR': ('A1', 'B1'),
+    'CA': ('A1', 'C'),
+    'AU': ('A1', 'B2'),
+}
+GENERIC_KIND_CODES = ('A1', 'B1', 'B2', 'A')
+
+MAX_CANDIDATES = 4  # Page requests per patent, including the number as given
+
+SERIES_RE = re.compile(r'^([A-Z]*)(\d+)$')
+
+
+def number_pattern(country, number):
+    """Shape of a number that usually decides its kind code, e.g. 'US:7' or 'USRE:5'
+
+    The digit count separates US grants (7-8 digits) from published
+    applications (11 digits, A1) and so on.
+    """
+    match = SERIES_RE.match(number)
+    series, digits = match.groups() if match else ('', number)
+    return f"{country}{series}:{len(digits)}"
+
+
+def is_not_found(error):
+    """True if a requests or aiohttp exception is an HTTP 404"""
+    return http_status(error) == 404
+
+
+class KindCodeResolver:
+    """Ranks the kind-code variants worth trying for a patent number
+
+    Every variant that turns out to exist is counted against its number
+    pattern, so once a few US 7-digit grants resolved as B2, later ones try
+    B2 first. The counts are kept in kind_codes.json in the output directory
+    and grow across runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counts = {}   # pattern -> Counter(kind -> hits)
+        self._new = {}      # Hits since load(), merged into the file on save()
+
+    def load(self):
+        """Read learned counts from the JSON file (missing or damaged file = start fresh)"""
+        counts = self._read()
+        with self._lock:
+            self._counts = {pattern: Counter(kinds) for pattern, kinds in counts.items()}
+            self._new = {}
+        return self
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            return {pattern: {kind: int(hits) for kind, hits in kinds.items()}
+                    for pattern, kinds in data.items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def candidates(self, patent_number):
+        """Clean numbers to request, best guess first
+
+        A kind code given in the input is tried first. Without one, the
+        learned favourite for the pattern is tried first if there is one,
+        otherwise the number as given.
+        """
+        clean_number = clean_patent_number(patent_number)
+        parts = split_patent_number(clean_number)
+        if parts is None:
+            return [clean_number]
+        country, number, kind = parts
+
+        with self._lock:
+            counts = self._counts.get(number_pattern(country, number))
+            learned = [k for k, _ in counts.most_common()] if counts else []
+        defaults = list(DEFAULT_KIND_CODES.get(country, GENERIC_KIND_CODES))
+        if kind:
+            order = [kind] + learned + defaults
+        elif learned:
+            order = learned[:1] + [''] + learned[1:] + defaults
+        else:
+            order = [''] + defaults
+
+        seen = []
+        for k in order:
+            if k not in seen:
+                seen.append(k)
+        return [f"{country}{number}{k}" for k in seen[:MAX_CANDIDATES]]
+
+    def record(self, resolved_number):
+        """Count a number (with kind code) whose page was found"""
+        parts = split_patent_number(resolved_number)
+        if parts is None or not parts[2]:
+            return
+        country, number, kind = parts
+        pattern = number_pattern(country, number)
+        with self._lock:
+            self._counts.setdefault(pattern, Counter())[kind] += 1
+            self._new.setdefault(pattern, Counter())[kind] += 1
+
+    def save(self):
+        """Merge this run's hits into the JSON file (atomic replace)"""
+        if not self.path:
+            return
+        with self._lock:
+            new, self._new = self._new, {}
+        if not new:
+            return
+        # Re-read so parallel shard processes don't overwrite each other's counts
+        merged = {pattern: Counter(kinds) for pattern, kinds in self._read().items()}
+        for pattern, kinds in new.items():
+            merged.setdefault(pattern, Counter()).update(kinds)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({pattern: dict(kinds) for pattern, kinds in sorted(merged.items())}, f, indent=1)
+        os.replace(temp_path, self.path)
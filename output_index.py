@@ -0,0 +1,146 @@
+"""
+Output directory index for the Patent Downloader
+Scans downloaded_patents/ once so already-downloaded PDFs can be skipped without any network call
+"""
+
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+PDF_MAGIC = b'%PDF'
+PDF_TRAILER = b'%%EOF'
+TRAILER_WINDOW = 1024  # The %%EOF marker must appear within the last KB of the file
+
+# Created the first time the directory is indexed. Since then PDFs are only ever renamed into
+# place after validation (pdf_transfer.PdfFileWriter), so anything newer needs no re-check.
+VALIDATED_WRITES_MARKER = '.validated_writes'
+
+IndexEntry = namedtuple('IndexEntry', ['name', 'size', 'mtime'])
+
+
+def is_valid_pdf(path):
+    """Check a PDF's header magic and end-of-file trailer without reading the whole file"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(PDF_MAGIC)) != PDF_MAGIC:
+                return False
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - TRAILER_WINDOW))
+            return PDF_TRAILER in f.read()
+    except OSError:
+        return False
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the hex SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OutputIndex:
+    """In-memory index of the PDFs in the output directory
+
+    Files written since validated writes began (see VALIDATED_WRITES_MARKER)
+    are trusted as they are. Older files are validated, with results cached
+    per (size, mtime), so each is opened at most once per run.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.entries = {}
+        self._validated = {}
+        self._hashes = {}
+        self.trusted_since = None  # mtime after which PDFs are known to be complete
+        self._lock = threading.Lock()
+
+    def _load_marker(self):
+        """Read (creating if needed) the validated-writes marker's mtime"""
+        path = os.path.join(self.output_dir, VALIDATED_WRITES_MARKER)
+        try:
+            if not os.path.exists(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write("PDFs newer than this file were validated before being saved\n")
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def scan(self):
+        """Index every .pdf in the output directory (one directory listing); returns the count"""
+        entries = {}
+        try:
+            with os.scandir(self.output_dir) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith('.pdf') or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    key = entry.name[:-4]
+                    entries[key] = IndexEntry(entry.name, stat.st_size, stat.st_mtime)
+        except FileNotFoundError:
+            pass
+        trusted_since = self._load_marker()
+        with self._lock:
+            self.entries = entries
+            self.trusted_since = trusted_since
+        return len(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def path_for(self, patent_key):
+        return os.path.join(self.output_dir, f"{patent_key}.pdf")
+
+    def get(self, patent_key):
+        """Return the IndexEntry for a patent, or None"""
+        with self._lock:
+            return self.entries.get(patent_key)
+
+    def is_complete(self, patent_key):
+        """True if the patent's PDF is present and passes the header/trailer check"""
+        entry = self.get(patent_key)
+        if entry is None or entry.size == 0:
+            return False
+        if self.trusted_since is not None and entry.mtime > self.trusted_since:
+            return True
+        signature = (entry.size, entry.mtime)
+        with self._lock:
+            cached = self._validated.get(patent_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        valid = is_valid_pdf(self.path_for(patent_key))
+        with self._lock:
+            self._validated[patent_key] = (signature, valid)
+        return valid
+
+    def sha256(self, patent_key):
+        """Return the SHA-256 of a patent's PDF, computed on first request"""
+        entry = self.get(patent_key)
+        if entry is None:
+            return None
+        signature = (entry.size, entry.mtime)
+        with self._lock:
+            cached = self._hashes.get(patent_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digest = file_sha256(self.path_for(patent_key))
+        with self._lock:
+            self._hashes[patent_key] = (signature, digest)
+        return digest
+
+    def refresh(self, patent_key):
+        """Re-stat one patent's PDF after it has been written (or removed)"""
+        path = self.path_for(patent_key)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self.entries.pop(patent_key, None)
+            return None
+        entry = IndexEntry(os.path.basename(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            self.entries[patent_key] = entry
+        return entry
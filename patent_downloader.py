@@ -0,0 +1,1471 @@
+"""
+Google Patent PDF Downloader - Core Engine
+GUI-free download pipeline shared by the Tkinter GUI and the command-line interface
+Compatible with Python 3.8+
+"""
+
+import os
+import asyncio
+import threading
+import logging
+import time
+import itertools
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed
+from pathlib import Path
+from datetime import datetime
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+import patent_parser
+from patent_numbers import clean_patent_number, PatentNumberDeduper
+from patent_input import PatentNumberReader, ColumnNotFoundError
+from kind_resolver import KindCodeResolver, KIND_CODES_FILENAME, is_not_found
+from retry_policy import RetryPolicy, DEFAULT_MAX_RETRIES, describe as describe_error
+from hedge import LatencyTracker, HedgeCancelled, SOURCE_GOOGLE, SOURCE_FPO
+from pdf_transfer import (
+    Deadline, ThroughputWatchdog, PdfFileWriter, patent_deadline, current_deadline,
+    iter_response_chunks, next_check_in, resume_request, resume_position, resume_validator, discard_partial, IncompleteTransfer,
+    DEFAULT_PATENT_BUDGET, DEFAULT_MIN_THROUGHPUT, DEFAULT_STALL_WINDOW
+)
+from browser_pool import (
+    BrowserPool, block_requests, blocked_urls, DEFAULT_PAGES_PER_BROWSER, DEFAULT_BLOCK_PROFILE, PAGE_LOAD_TIMEOUT
+)
+from download_engine import create_engine, engine_class_for, Stage, Finished
+from http_client import HttpClient
+from async_http_client import AsyncHttpClient, require_aiohttp
+from response_cache import ResponseCache, CACHE_DIRNAME, DEFAULT_TTL
+from rate_limiter import RateLimiter
+from report_writer import ReportWriter, recover_journals
+from output_index import OutputIndex
+from job_state import (
+    JobStateStore, JOB_STATE_FILENAME, STATUS_PENDING, STATUS_FETCHED, STATUS_DOWNLOADED, STATUS_FAILED
+)
+
+DEFAULT_OUTPUT_DIR = 'downloaded_patents'
+DEFAULT_COLUMN = 'Display Key'
+MAIN_LOG_FILE = 'patent_download_gui.log'
+FAILED_LOG_FILE = 'failed_patents.log'
+
+MODE_DOWNLOAD = 'download'  # Download PDF + details
+MODE_FETCH = 'fetch'        # Fetch details only
+
+IO_THREADS = 4  # asyncio engine: threads for SQLite/disk work (SQLite serializes writes anyway)
+HEDGE_START_POLL = 0.5  # Seconds between checks that a queued Google attempt failed before starting
+
+MALFORMED_REASON = "Malformed patent number (not requested)"
+
+logger = logging.getLogger(__name__)
+failed_logger = logging.getLogger('failed_patents')
+
+
+def configure_logging(console=True):
+    """Setup the main log file and the separate failed patents log"""
+    handlers = [logging.FileHandler(MAIN_LOG_FILE)]
+    if console:
+        handlers.append(logging.StreamHandler())
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+    # Setup separate logger for failed downloads
+    if not failed_logger.handlers:
+        failed_logger.setLevel(logging.INFO)
+        failed_handler = logging.FileHandler(FAILED_LOG_FILE)
+        failed_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        failed_logger.addHandler(failed_handler)
+        failed_logger.propagate = False  # Don't propagate to root logger
+
+
+class DownloadListener:
+    """Receives progress from a PatentDownloader run
+
+    Override what you need. log() may be called from worker threads; status(),
+    progress() and result() are called from the thread running run().
+    """
+
+    def log(self, message):
+        pass
+
+    def status(self, message, status_type='info'):
+        pass
+
+    def progress(self, current, total):
+        pass
+
+    def result(self, index, patent_number, success, error):
+        pass
+
+
+class PatentDownloader:
+    """Reads patent numbers, downloads PDFs/details concurrently and writes the report"""
+
+    def __init__(self, output_dir=DEFAULT_OUTPUT_DIR, mode=MODE_DOWNLOAD, workers=None,
+                 resume=True, host_limits=None, use_cache=True, cache_ttl=DEFAULT_TTL,
+                 run_label=None, listener=None, engine_mode='threaded', stage_workers=None,
+                 parse_processes=0, max_retries=DEFAULT_MAX_RETRIES, hedge=False,
+                 patent_timeout=DEFAULT_PATENT_BUDGET, min_throughput=DEFAULT_MIN_THROUGHPUT,
+                 stall_window=DEFAULT_STALL_WINDOW, browsers=0, browser_pages=DEFAULT_PAGES_PER_BROWSER,
+                 browser_block=DEFAULT_BLOCK_PROFILE, block_urls=(), allow_urls=()):
+        self.output_dir = output_dir
+        self.fetch_only = (mode == MODE_FETCH)
+        self.engine_class = engine_class_for(engine_mode)
+        if self.engine_class.is_async:
+            require_aiohttp()
+        # Threads for the threaded engine, in-flight coroutines for the asyncio engine
+        workers = self.engine_class.default_workers if workers is None else int(workers)
+        self.workers = max(1, min(workers, self.engine_class.worker_limit))
+        self.parse_processes = max(0, int(parse_processes or 0))  # 0 = parse in the worker threads
+        # Threads per stage for the pipeline engine (the report writer is always a single thread);
+        # one parse thread per worker process keeps every process busy
+        parse_threads = self.parse_processes or max(1, (os.cpu_count() or 2) // 2)
+        self.stage_workers = {'fetch': self.workers, 'parse': parse_threads, 'pdf': self.workers}
+        if stage_workers:
+            self.stage_workers.update(stage_workers)
+        self.resume = resume
+        self.host_limits = host_limits
+        self.use_cache = use_cache
+        self.cache_ttl = cache_ttl
+        self.max_retries = max_retries  # Extra attempts for timeouts, 429s and 5xx
+        self.hedge = hedge  # Race FreePatentsOnline against slow Google Patents downloads
+        self.patent_timeout = patent_timeout  # Seconds per patent across all sources (None/0 = no limit)
+        self.min_throughput = min_throughput  # Bytes/s a PDF stream must average over stall_window (0 = off)
+        self.stall_window = stall_window
+        self.browsers = max(0, int(browsers or 0))  # Headless Chrome instances for the render fallback (0 = off)
+        self.browser_pages = browser_pages  # Pages per browser before it is restarted
+        # URL patterns Chrome doesn't fetch when rendering: a profile, adjusted by block_urls / allow_urls
+        self.browser_block = browser_block
+        self.blocked_urls = blocked_urls(browser_block, block_urls, allow_urls)
+        self.run_label = run_label  # Added to the report name so parallel runs don't collide
+        self.listener = listener or DownloadListener()
+
+        self.failed_patents = []  # Track failed patents
+        self.patent_info_list = []  # Store patent information for Excel export
+        self.engine = None  # Active download engine while a run is in progress
+        self.http = None  # Shared pooled HTTP client while a run is in progress
+        self.async_http = None  # aiohttp client, asyncio engine only
+        self.parse_executor = None  # Keeps page parsing off the event loop, asyncio engine only
+        self.io_executor = None  # Cache, job state and report writes off the event loop, asyncio engine only
+        self.parse_pool = None  # Worker processes for full-page parsing, when parse_processes > 0
+        self.cache = None  # On-disk page cache while a run is in progress
+        self.rate_limiter = None  # Per-host adaptive rate limiter while a run is in progress
+        self.report = None  # Streaming Excel report writer while a run is in progress
+        self.job_state = None  # Persistent per-patent status store while a run is in progress
+        self.output_index = None  # Index of PDFs already in output_dir, built when a run starts
+        self.kind_resolver = None  # Learned kind-code variants while a run is in progress
+        self.retry_policy = None  # Backoff for transient failures while a run is in progress
+        self.google_latency = None  # Google download times that decide when to hedge, hedge mode only
+        self.hedge_executor = None  # Threads for the two racing sources, threaded engine in hedge mode only
+        self.browser_pool = None  # Headless Chrome for patents no source has a PDF for, when browsers > 0
+        self.results_lock = threading.Lock()  # Guards patent_info_list / failed_patents across workers
+        self._stop_requested = False
+
+    def log(self, message):
+        """Send a message to the listener"""
+        self.listener.log(message)
+
+    def stop(self):
+        """Stop the download process"""
+        self._stop_requested = True
+        if self.engine:
+            self.engine.stop()  # Cancel queued patents, let in-flight ones finish
+        if self.rate_limiter:
+            self.rate_limiter.cancel()  # Don't keep workers waiting on a backoff
+        if self.retry_policy:
+            self.retry_policy.cancel()
+
+    def read_patent_numbers(self, input_file, column_name=DEFAULT_COLUMN):
+        """Open the input file and return a lazy PatentNumberReader, or None if it can't be read"""
+        try:
+            reader = PatentNumberReader(input_file, column_name)
+            self.log(f"Input file opened. Columns: {reader.columns}")
+            if reader.estimated_total is not None:
+                self.log(f"About {reader.estimated_total} rows to read")
+            return reader
+
+        except ColumnNotFoundError as e:
+            self.log(f"ERROR: Column '{column_name}' not found")
+            self.log(f"Available columns: {e.columns}")
+            return None
+        except Exception as e:
+            self.log(f"ERROR reading input file: {e}")
+            return None
+
+    def start_browser(self):
+        """Start a headless Chrome WebDriver (called by the browser pool when it needs one)"""
+        chrome_options = Options()
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        try:
+            driver = webdriver.Chrome(options=chrome_options)
+        except Exception:
+            self.log("ERROR: Could not start Chrome browser")
+            self.log("Make sure Chrome and ChromeDriver are installed (pip install webdriver-manager)")
+            raise
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        try:
+            block_requests(driver, self.blocked_urls)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    def clean_patent_number(self, patent_number):
+        """Clean patent number"""
+        return clean_patent_number(patent_number)
+
+    def construct_pdf_url(self, patent_number):
+        """Construct direct PDF URL from patent number (works for many patents)"""
+        clean_number = self.clean_patent_number(patent_number)
+
+        # Google Patents PDF URL pattern
+        # Example: US1234567A -> https://patentimages.storage.googleapis.com/.../US1234567.pdf
+        # This is a common pattern but may not work for all patents
+
+        # Try to construct the patent page URL first
+        patent_url = f"https://patents.google.com/patent/{clean_number}"
+
+        # For direct PDF, we'll try common patterns
+        # Pattern 1: Standard format
+        base_url = "https://patentimages.storage.googleapis.com"
+
+        # Extract country code and number
+        import re
+        match = re.match(r'([A-Z]{2})(\d+)([A-Z]\d*)?', clean_number)
+        if match:
+            country = match.group(1)
+            number = match.group(2)
+            kind = match.group(3) if match.group(3) else ''
+
+            # Try common PDF URL pattern
+            # Note: The actual hash in the URL is unpredictable, so this is a fallback
+            # We'll need to fetch the page to get the real PDF URL
+            return None  # Return None to indicate we need to fetch the page
+
+        return None
+
+    def extract_patent_info(self, patent_number, html_content):
+        """Extract patent information from HTML"""
+        try:
+            if self.parse_pool:
+                # The fast scan costs less than the round trip; only full parses go to the pool
+                info = patent_parser.extract_fast(patent_number, html_content)
+                if info is None:
+                    info = self.parse_pool.submit(
+                        patent_parser.extract_compressed, patent_number, patent_parser.compress_page(html_content)
+                    ).result()
+                return info
+            return patent_parser.extract_patent_info(patent_number, html_content)
+
+        except Exception as e:
+            self.log(f"  Warning: Could not extract patent info: {e}")
+            return {
+                'Patent Number': patent_number,
+                'Title': 'N/A',
+                'Application Date': 'N/A',
+                'Publication Date': 'N/A',
+                'Applicant/Assignee': 'N/A',
+                'Download Status': 'Success',
+                'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+
+    def fpo_patent_info(self, patent_number):
+        """Report row for a PDF downloaded from FreePatentsOnline (no metadata available)"""
+        return {
+            'Patent Number': patent_number,
+            'Title': 'Downloaded from FreePatentsOnline',
+            'Application Date': 'N/A',
+            'Publication Date': 'N/A',
+            'Applicant/Assignee': 'N/A',
+            'Download Status': 'Success (FreePatentsOnline)',
+            'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def try_freepatentsonline(self, patent_number, add_row=True, filename=None, cancel=None):
+        """Try to download from FreePatentsOnline as fallback
+
+        Returns the report row on success, else False. filename overrides
+        <output_dir>/<number>.pdf; cancel (an Event) aborts the transfer.
+        """
+        try:
+            clean_number = self.clean_patent_number(patent_number)
+            self.log(f"  Trying FreePatentsOnline...")
+
+            # FreePatentsOnline URL format
+            # Example: https://www.freepatentsonline.com/US20160122713.pdf
+            fpo_url = f"https://www.freepatentsonline.com/{clean_number}.pdf"
+
+            # Try direct PDF download
+            def fetch_pdf():
+                if cancel is not None and cancel.is_set():
+                    raise HedgeCancelled("download taken over by the other source")
+                with self.http.get(fpo_url, stream=True) as response:
+                    response.raise_for_status()
+
+                    # Check if it's actually a PDF
+                    content_type = response.headers.get('content-type', '')
+                    if 'pdf' not in content_type.lower():
+                        return False
+
+                    self.save_response(response, filename or self.pdf_path(clean_number), cancel)
+                return True
+
+            if not self.with_retries(patent_number, fpo_url, fetch_pdf, cancel=cancel):
+                return False
+
+            self.log(f"  Downloaded from FreePatentsOnline!")
+
+            # Add basic patent info (simplified)
+            patent_info = self.fpo_patent_info(patent_number)
+            if add_row:
+                self.add_patent_info(patent_info)
+            return patent_info
+
+        except Exception as e:
+            self.log(f"  FreePatentsOnline failed: {e}")
+            return False
+
+    def with_retries(self, patent_number, url, func, cancel=None):
+        """Call func(), retrying timeouts, 429s and 5xx with backoff; other errors raise at once
+
+        cancel (an Event) ends a backoff wait and stops further retries.
+        """
+        if not self.retry_policy:
+            return func()
+        return self.retry_policy.call(
+            func, on_retry=lambda retry, error, wait: self.log_retry(patent_number, url, retry, error, wait),
+            cancel=cancel
+        )
+
+    async def with_retries_async(self, patent_number, url, func):
+        """Asyncio version of with_retries; func() returns a coroutine"""
+        if not self.retry_policy:
+            return await func()
+        return await self.retry_policy.call_async(
+            func, on_retry=lambda retry, error, wait: self.log_retry(patent_number, url, retry, error, wait)
+        )
+
+    def log_retry(self, patent_number, url, retry, error, wait):
+        """Log a retry to the run log and failed_patents.log"""
+        reason = describe_error(error)
+        attempts = self.retry_policy.max_retries + 1
+        self.log(f"  {reason}, retrying in {wait:.1f}s (attempt {retry + 1}/{attempts})...")
+        failed_logger.info(
+            f"RETRY | Original: {patent_number} | Attempt: {retry + 1}/{attempts} | "
+            f"Reason: {reason}: {error} | URL: {url} | Wait: {wait:.1f}s"
+        )
+
+    def page_candidates(self, patent_number):
+        """Numbers to try on Google Patents: the input first, then likely kind-code variants"""
+        if self.kind_resolver:
+            return self.kind_resolver.candidates(patent_number)
+        return [self.clean_patent_number(patent_number)]
+
+    def page_resolved(self, patent_number, candidate):
+        """Note which variant of a number Google Patents knows"""
+        if candidate != self.clean_patent_number(patent_number):
+            self.log(f"  Resolved {patent_number} as {candidate}")
+        if self.kind_resolver:
+            self.kind_resolver.record(candidate)
+
+    def fetch_patent_page(self, patent_number, fetch_only=False, cancel=None):
+        """Fetch a patent's Google Patents page, trying kind-code variants on 404
+
+        cancel (an Event) stops before the next variant or retry.
+        """
+        # Served from the on-disk cache when the page was fetched recently; otherwise
+        # only streamed until the metadata (and PDF link) have been seen
+        stop_when = lambda text: patent_parser.has_required_fields(text, need_pdf_url=not fetch_only)
+        candidates = self.page_candidates(patent_number)
+        for attempt, candidate in enumerate(candidates, 1):
+            url = f"https://patents.google.com/patent/{candidate}/en"
+            if cancel is not None and cancel.is_set():
+                raise HedgeCancelled("download taken over by the other source")
+            try:
+                html = self.with_retries(
+                    patent_number, url, lambda: self.http.get_text(url, stop_when=stop_when), cancel=cancel
+                )
+            except Exception as e:
+                if attempt < len(candidates) and is_not_found(e):
+                    continue
+                raise
+            self.page_resolved(patent_number, candidate)
+            return html
+
+    def try_direct_download(self, patent_number, fetch_only=False, add_row=True, filename=None, cancel=None):
+        """Try to download patent directly without Chrome
+
+        Returns the report row on success, else False. filename is passed
+        on to download_pdf_direct; cancel (an Event) aborts the page fetch
+        and the PDF transfer.
+        """
+        clean_number = self.clean_patent_number(patent_number)
+
+        # Method 1: Try to fetch the patent page and extract PDF link using requests
+        try:
+            action_text = "Fetching details" if fetch_only else "Download"
+            self.log(f"  Trying Google Patents ({action_text})...")
+            html = self.fetch_patent_page(patent_number, fetch_only, cancel=cancel)
+
+            # Extract patent information for Excel
+            patent_info = self.extract_patent_info(patent_number, html)
+
+            # If fetch only, we are done
+            if fetch_only:
+                patent_info['Download Status'] = 'Details Fetched'
+                self.add_patent_info(patent_info)
+                self.log(f"  Details fetched successfully!")
+                return patent_info
+
+            # Try to find PDF link in the HTML
+            pdf_url = patent_parser.find_pdf_url(html)
+
+            if pdf_url:
+                self.log(f"  Found PDF URL on Google Patents: {pdf_url}")
+                if self.download_pdf_direct(pdf_url, clean_number, filename=filename, cancel=cancel):
+                    self.log(f"  Google Patents download successful!")
+                    # Add to patent info list
+                    if add_row:
+                        self.add_patent_info(patent_info)
+                    return patent_info
+
+            return False
+
+        except Exception as e:
+            self.log(f"  Google Patents failed: {e}")
+            return False
+
+    def add_patent_info(self, patent_info):
+        """Record patent information for the Excel report (safe to call from workers)"""
+        self.add_report_row(patent_info)
+        status = STATUS_FETCHED if patent_info.get('Download Status') == 'Details Fetched' else STATUS_DOWNLOADED
+        self.record_job_state(patent_info['Patent Number'], status, info=patent_info)
+
+    def add_report_row(self, patent_info):
+        """Append a row to the in-memory list and the report journal"""
+        with self.results_lock:
+            self.patent_info_list.append(patent_info)
+        if self.report:
+            self.report.append(patent_info)
+
+    def record_job_state(self, patent_number, status, reason=None, info=None):
+        """Persist a patent's status so an interrupted run can resume"""
+        if self.job_state:
+            self.job_state.record(self.clean_patent_number(patent_number), patent_number, status, reason, info)
+
+    def log_failed_patent(self, original_number, clean_number, reason, url):
+        """Log failed patent to separate log file"""
+        failed_info = {
+            'original': original_number,
+            'cleaned': clean_number,
+            'reason': reason,
+            'url': url
+        }
+        with self.results_lock:
+            self.failed_patents.append(failed_info)
+        self.record_job_state(original_number, STATUS_FAILED, reason=reason)
+
+        # Log to separate failed patents file
+        failed_logger.info(
+            f"FAILED | Original: {original_number} | Cleaned: {clean_number} | "
+            f"Reason: {reason} | URL: {url}"
+        )
+
+    def skip_if_downloaded(self, patent_number, clean_number):
+        """Record a skipped row and return True if a complete PDF is already on disk"""
+        if self.fetch_only or not self.output_index:
+            return False
+        if self.output_index.is_complete(clean_number):
+            self.log(f"  Already downloaded: {clean_number}.pdf")
+            self.add_patent_info({
+                'Patent Number': patent_number,
+                'Title': 'N/A',
+                'Application Date': 'N/A',
+                'Publication Date': 'N/A',
+                'Applicant/Assignee': 'N/A',
+                'Download Status': 'Skipped (already downloaded)',
+                'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            return True
+        if self.output_index.get(clean_number):
+            self.log(f"  Existing {clean_number}.pdf is incomplete, downloading again")
+        return False
+
+    def fetch_failed(self, patent_number):
+        """Record a patent whose details could not be fetched; returns False"""
+        self.log(f"  Could not fetch details from Google Patents")
+        self.record_job_state(patent_number, STATUS_FAILED, reason="Could not fetch details from Google Patents")
+        # We could add an entry for failed fetch if desired, but user flow usually implies just logging failure
+        return False
+
+    def download_failed(self, patent_number, clean_number):
+        """Log a patent that neither source could provide; returns False"""
+        url = f"https://patents.google.com/patent/{clean_number}/en"
+        error_msg = "PDF not found on Google Patents or FreePatentsOnline"
+        deadline = current_deadline()
+        if deadline and deadline.expired:
+            error_msg = f"Gave up after the {deadline.seconds:g}s per-patent time budget"
+        self.log(f"  FAILED: {error_msg}")
+        self.log_failed_patent(patent_number, clean_number, error_msg, url)
+        return False
+
+    def download_patent(self, patent_number):
+        """Download a single patent within the per-patent time budget"""
+        with patent_deadline(self.new_deadline()):
+            return self.download_from_sources(patent_number)
+
+    def download_from_sources(self, patent_number):
+        """Download a single patent - Try Google Patents, then FreePatentsOnline"""
+        clean_number = self.clean_patent_number(patent_number)
+        fetch_only = self.fetch_only
+
+        # Skip the network entirely if a complete PDF is already on disk
+        if self.skip_if_downloaded(patent_number, clean_number):
+            return True
+
+        if self.hedge_executor and not fetch_only:
+            return self.download_patent_hedged(patent_number)
+
+        # Try Google Patents first
+        if self.try_direct_download(patent_number, fetch_only=fetch_only):
+            if not fetch_only and self.output_index:
+                self.output_index.refresh(clean_number)
+            return True
+
+        # If fetch only mode, we don't try FPO or other incomplete sources as they don't provide rich metadata
+        if fetch_only:
+             return self.fetch_failed(patent_number)
+
+        # If Google Patents failed, try FreePatentsOnline
+        self.log(f"  Google Patents failed, trying FreePatentsOnline...")
+        if self.try_freepatentsonline(patent_number):
+            if self.output_index:
+                self.output_index.refresh(clean_number)
+            return True
+
+        # Neither source has a PDF - print the rendered page if a browser pool is configured
+        if self.try_browser_render(patent_number):
+            if self.output_index:
+                self.output_index.refresh(clean_number)
+            return True
+
+        # Both sources failed - log it
+        return self.download_failed(patent_number, clean_number)
+
+    def hedged_attempt(self, source, patent_number, download, cancel, claim):
+        """Run one source of a hedged download into its own file
+
+        download(filename) returns the report row or False. The first source
+        to succeed moves its file into place and sets cancel; the other's
+        partial file is removed. Returns the row if this source won.
+        """
+        clean_number = self.clean_patent_number(patent_number)
+        final_path = self.pdf_path(clean_number)
+        source_path = f"{final_path}.{source}"  # Written via <source_path>.part, renamed by the winner
+        started = time.monotonic()
+        patent_info = False
+        try:
+            patent_info = download(source_path)
+        finally:
+            with claim:
+                won = bool(patent_info) and not cancel.is_set()
+                if won:
+                    os.replace(source_path, final_path)
+                    cancel.set()
+            if not won:
+                self.discard_attempt(source_path)
+            self.sample_google_latency(source, started, patent_info, cancel)
+        return patent_info if won else False
+
+    def discard_attempt(self, source_path):
+        """Remove a losing or failed hedged attempt's file, .part and resume record
+
+        Hedged transfers aren't resumed: the next attempt downloads to
+        <number>.pdf.part and would never find <number>.pdf.google.part.
+        """
+        if os.path.exists(source_path):
+            os.remove(source_path)
+        discard_partial(source_path)
+
+    def sample_google_latency(self, source, started, patent_info, cancel):
+        """Time a finished or cancelled Google attempt for the hedge threshold
+
+        Losing attempts count too - leaving them out would keep only the fast
+        downloads and pull the p95 down. A cancelled one adds its time so far
+        as a lower bound. Google failing on its own says nothing about how
+        long a download takes and isn't sampled.
+        """
+        if source == SOURCE_GOOGLE and (patent_info or cancel.is_set()):
+            self.google_latency.record(time.monotonic() - started)
+
+    def download_patent_hedged(self, patent_number):
+        """download_patent, racing FreePatentsOnline against Google Patents once Google is slow
+
+        FreePatentsOnline starts straight away if Google fails, or once Google
+        has taken longer than the recent p95 of its downloads, timed from when
+        its attempt starts rather than from when it was queued. Whichever
+        source delivers a PDF first wins; the other is cancelled and stops at
+        its next request, retry wait or chunk.
+        """
+        clean_number = self.clean_patent_number(patent_number)
+        cancel = threading.Event()
+        claim = threading.Lock()
+        google_started = threading.Event()
+
+        def google(filename):
+            google_started.set()
+            return self.try_direct_download(patent_number, add_row=False, filename=filename, cancel=cancel)
+
+        def fpo(filename):
+            return self.try_freepatentsonline(patent_number, add_row=False, filename=filename, cancel=cancel)
+
+        # Each source runs in a copy of this thread's context, so it sees the patent's deadline
+        pending = [self.hedge_executor.submit(
+            contextvars.copy_context().run, self.hedged_attempt, SOURCE_GOOGLE, patent_number, google, cancel, claim
+        )]
+        # Time spent waiting for a hedge thread isn't Google being slow
+        while not google_started.wait(HEDGE_START_POLL) and not pending[0].done():
+            pass
+        threshold = self.google_latency.threshold()
+        done, _ = wait(pending, timeout=threshold)
+        if done and pending[0].result():
+            patent_info, winner = pending[0].result(), SOURCE_GOOGLE
+        else:
+            if done:
+                self.log(f"  Google Patents failed, trying FreePatentsOnline...")
+            else:
+                self.log(f"  Google Patents slower than {threshold:.1f}s, also trying FreePatentsOnline...")
+                self.google_latency.count('hedged')
+            sources = {pending[0]: SOURCE_GOOGLE}
+            fpo_future = self.hedge_executor.submit(
+                contextvars.copy_context().run, self.hedged_attempt, SOURCE_FPO, patent_number, fpo, cancel, claim
+            )
+            sources[fpo_future] = SOURCE_FPO
+            patent_info = winner = None
+            for future in as_completed(sources):
+                if future.result():
+                    patent_info, winner = future.result(), sources[future]
+                    break
+
+        if patent_info:
+            self.google_latency.count(f"{winner}_won")
+        else:
+            patent_info = self.try_browser_render(patent_number, add_row=False)
+            if not patent_info:
+                return self.download_failed(patent_number, clean_number)
+        self.add_patent_info(patent_info)
+        if self.output_index:
+            self.output_index.refresh(clean_number)
+        return True
+
+    def hedge_threads(self):
+        """Threads (and so concurrent requests) a hedged threaded run needs: one per source per worker"""
+        return self.workers * 2
+
+    def build_stages(self):
+        """download_patent split into pipeline stages: page fetch -> parse -> PDF -> report"""
+        stages = [
+            Stage('fetch', self.fetch_page_stage, self.stage_workers['fetch']),
+            Stage('parse', self.parse_page_stage, self.stage_workers['parse']),
+        ]
+        if not self.fetch_only:
+            stages.append(Stage('pdf', self.download_pdf_stage, self.stage_workers['pdf']))
+        # A single writer keeps report rows and job state updates in one place
+        stages.append(Stage('report', self.write_report_stage, 1))
+        return stages
+
+    def fetch_page_stage(self, patent_number):
+        """Pipeline stage 1: fetch the Google Patents page (html None if that failed)"""
+        clean_number = self.clean_patent_number(patent_number)
+        if self.skip_if_downloaded(patent_number, clean_number):
+            return Finished(True)
+
+        job = {'patent_number': patent_number, 'clean_number': clean_number,
+               'html': None, 'info': None, 'pdf_url': None, 'budget': None}
+        deadline = self.new_deadline()
+        with patent_deadline(deadline):
+            try:
+                action_text = "Fetching details" if self.fetch_only else "Download"
+                self.log(f"  Trying Google Patents ({action_text})...")
+                job['html'] = self.fetch_patent_page(patent_number, self.fetch_only)
+            except Exception as e:
+                self.log(f"  Google Patents failed: {e}")
+                if self.fetch_only:
+                    return Finished(self.fetch_failed(patent_number))
+        # Time spent queued between stages doesn't count against the budget
+        if deadline:
+            job['budget'] = deadline.remaining()
+        return job
+
+    def parse_page_stage(self, job):
+        """Pipeline stage 2: extract the report row and PDF link from the page"""
+        html = job.pop('html')
+        if html is not None:
+            job['info'] = self.extract_patent_info(job['patent_number'], html)
+            job['pdf_url'] = patent_parser.find_pdf_url(html)
+            if self.fetch_only:
+                job['info']['Download Status'] = 'Details Fetched'
+                self.log(f"  Details fetched successfully!")
+        return job
+
+    def download_pdf_stage(self, job):
+        """Pipeline stage 3: download the PDF from Google Patents, else FreePatentsOnline"""
+        deadline = Deadline(job['budget']) if job['budget'] is not None else None
+        with patent_deadline(deadline):
+            return self.download_pdf_sources(job)
+
+    def download_pdf_sources(self, job):
+        """Body of download_pdf_stage, run inside the patent's remaining budget"""
+        patent_number, clean_number = job['patent_number'], job['clean_number']
+        if job['pdf_url']:
+            self.log(f"  Found PDF URL on Google Patents: {job['pdf_url']}")
+            try:
+                if self.download_pdf_direct(job['pdf_url'], clean_number):
+                    self.log(f"  Google Patents download successful!")
+                    return job
+            except Exception as e:
+                self.log(f"  Google Patents failed: {e}")
+
+        self.log(f"  Google Patents failed, trying FreePatentsOnline...")
+        if self.try_freepatentsonline(patent_number, add_row=False):
+            job['info'] = self.fpo_patent_info(patent_number)
+            return job
+        rendered = self.try_browser_render(patent_number, add_row=False)
+        if rendered:
+            job['info'] = rendered
+            return job
+        return Finished(self.download_failed(patent_number, clean_number))
+
+    def write_report_stage(self, job):
+        """Pipeline stage 4: record the finished patent in the report and job state"""
+        self.add_patent_info(job['info'])
+        if not self.fetch_only and self.output_index:
+            self.output_index.refresh(job['clean_number'])
+        return True
+
+    async def run_blocking(self, func, *args):
+        """Run func(*args) in the I/O executor (job state, output index, report) and await it
+
+        Keeps SQLite and file writes - which can wait up to the SQLite busy
+        timeout when a parallel shard holds the database - off the event loop.
+        The call sees this task's context, including the patent's deadline.
+        """
+        call = functools.partial(contextvars.copy_context().run, func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, call)
+
+    async def download_patent_async(self, patent_number):
+        """Asyncio engine version of download_patent (same sources, same order)"""
+        with patent_deadline(self.new_deadline()):
+            return await self.download_from_sources_async(patent_number)
+
+    async def download_from_sources_async(self, patent_number):
+        """Asyncio version of download_from_sources"""
+        clean_number = self.clean_patent_number(patent_number)
+        fetch_only = self.fetch_only
+
+        if await self.run_blocking(self.skip_if_downloaded, patent_number, clean_number):
+            return True
+
+        if self.google_latency and not fetch_only:
+            return await self.download_patent_hedged_async(patent_number)
+
+        if await self.try_direct_download_async(patent_number, fetch_only=fetch_only):
+            if not fetch_only and self.output_index:
+                await self.run_blocking(self.output_index.refresh, clean_number)
+            return True
+
+        if fetch_only:
+            return await self.run_blocking(self.fetch_failed, patent_number)
+
+        self.log(f"  Google Patents failed, trying FreePatentsOnline...")
+        if await self.try_freepatentsonline_async(patent_number):
+            if self.output_index:
+                await self.run_blocking(self.output_index.refresh, clean_number)
+            return True
+
+        if await self.try_browser_render_async(patent_number):
+            if self.output_index:
+                await self.run_blocking(self.output_index.refresh, clean_number)
+            return True
+
+        return await self.run_blocking(self.download_failed, patent_number, clean_number)
+
+    async def hedged_attempt_async(self, source, patent_number, download, cancel):
+        """Asyncio version of hedged_attempt; the losing task is cancelled outright"""
+        clean_number = self.clean_patent_number(patent_number)
+        final_path = self.pdf_path(clean_number)
+        source_path = f"{final_path}.{source}"  # Written via <source_path>.part, renamed by the winner
+        started = time.monotonic()
+        patent_info = False
+        try:
+            patent_info = await download(source_path)
+        finally:
+            # Tasks share one event loop, so nothing can claim the file between check and set
+            won = bool(patent_info) and not cancel.is_set()
+            if won:
+                os.replace(source_path, final_path)
+                cancel.set()
+            else:
+                self.discard_attempt(source_path)
+            self.sample_google_latency(source, started, patent_info, cancel)
+        return patent_info if won else False
+
+    async def download_patent_hedged_async(self, patent_number):
+        """Asyncio version of download_patent_hedged"""
+        clean_number = self.clean_patent_number(patent_number)
+        cancel = threading.Event()
+
+        def google(filename):
+            return self.try_direct_download_async(patent_number, add_row=False, filename=filename)
+
+        def fpo(filename):
+            return self.try_freepatentsonline_async(patent_number, add_row=False, filename=filename)
+
+        google_task = asyncio.ensure_future(
+            self.hedged_attempt_async(SOURCE_GOOGLE, patent_number, google, cancel)
+        )
+        sources = {google_task: SOURCE_GOOGLE}
+        patent_info = winner = None
+        try:
+            threshold = self.google_latency.threshold()
+            done, _ = await asyncio.wait([google_task], timeout=threshold)
+            if done and google_task.result():
+                patent_info, winner = google_task.result(), SOURCE_GOOGLE
+            else:
+                if done:
+                    self.log(f"  Google Patents failed, trying FreePatentsOnline...")
+                else:
+                    self.log(f"  Google Patents slower than {threshold:.1f}s, also trying FreePatentsOnline...")
+                    self.google_latency.count('hedged')
+                fpo_task = asyncio.ensure_future(self.hedged_attempt_async(SOURCE_FPO, patent_number, fpo, cancel))
+                sources[fpo_task] = SOURCE_FPO
+                pending = set(sources)
+                while pending and not patent_info:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.result():
+                            patent_info, winner = task.result(), sources[task]
+        finally:
+            for task in sources:
+                task.cancel()
+
+        if patent_info:
+            self.google_latency.count(f"{winner}_won")
+        else:
+            patent_info = await self.try_browser_render_async(patent_number, add_row=False)
+            if not patent_info:
+                return await self.run_blocking(self.download_failed, patent_number, clean_number)
+        await self.run_blocking(self.add_patent_info, patent_info)
+        if self.output_index:
+            await self.run_blocking(self.output_index.refresh, clean_number)
+        return True
+
+    async def fetch_patent_page_async(self, patent_number, fetch_only=False):
+        """Asyncio version of fetch_patent_page"""
+        stop_when = lambda text: patent_parser.has_required_fields(text, need_pdf_url=not fetch_only)
+        candidates = self.page_candidates(patent_number)
+        for attempt, candidate in enumerate(candidates, 1):
+            url = f"https://patents.google.com/patent/{candidate}/en"
+            try:
+                html = await self.with_retries_async(
+                    patent_number, url, lambda: self.async_http.get_text(url, stop_when=stop_when)
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt < len(candidates) and is_not_found(e):
+                    continue
+                raise
+            self.page_resolved(patent_number, candidate)
+            return html
+
+    async def try_direct_download_async(self, patent_number, fetch_only=False, add_row=True, filename=None):
+        """Asyncio version of try_direct_download; parsing runs in the parse executor"""
+        clean_number = self.clean_patent_number(patent_number)
+        try:
+            action_text = "Fetching details" if fetch_only else "Download"
+            self.log(f"  Trying Google Patents ({action_text})...")
+            html = await self.fetch_patent_page_async(patent_number, fetch_only)
+
+            # Parsing is CPU-bound - keep it off the event loop
+            loop = asyncio.get_running_loop()
+            patent_info = await loop.run_in_executor(
+                self.parse_executor, self.extract_patent_info, patent_number, html
+            )
+
+            if fetch_only:
+                patent_info['Download Status'] = 'Details Fetched'
+                await self.run_blocking(self.add_patent_info, patent_info)
+                self.log(f"  Details fetched successfully!")
+                return patent_info
+
+            pdf_url = patent_parser.find_pdf_url(html)
+            if pdf_url:
+                self.log(f"  Found PDF URL on Google Patents: {pdf_url}")
+                if await self.download_pdf_direct_async(pdf_url, clean_number, filename=filename):
+                    self.log(f"  Google Patents download successful!")
+                    if add_row:
+                        await self.run_blocking(self.add_patent_info, patent_info)
+                    return patent_info
+
+            return False
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log(f"  Google Patents failed: {e}")
+            return False
+
+    async def try_freepatentsonline_async(self, patent_number, add_row=True, filename=None):
+        """Asyncio version of try_freepatentsonline"""
+        try:
+            clean_number = self.clean_patent_number(patent_number)
+            self.log(f"  Trying FreePatentsOnline...")
+            fpo_url = f"https://www.freepatentsonline.com/{clean_number}.pdf"
+
+            async def fetch_pdf():
+                async with self.async_http.get(fpo_url) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get('content-type', '')
+                    if 'pdf' not in content_type.lower():
+                        return False
+                    await self.save_response_async(response, clean_number, filename)
+                return True
+
+            if not await self.with_retries_async(patent_number, fpo_url, fetch_pdf):
+                return False
+
+            self.log(f"  Downloaded from FreePatentsOnline!")
+            patent_info = self.fpo_patent_info(patent_number)
+            if add_row:
+                await self.run_blocking(self.add_patent_info, patent_info)
+            return patent_info
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log(f"  FreePatentsOnline failed: {e}")
+            return False
+
+    async def download_pdf_direct_async(self, pdf_url, patent_number, filename=None):
+        """Asyncio version of download_pdf_direct"""
+        target = filename or self.pdf_path(patent_number)
+
+        async def fetch_pdf():
+            offset, headers = resume_request(target, pdf_url)
+            async with self.async_http.get(pdf_url, headers=headers or None) as response:
+                if response.status == 416:
+                    discard_partial(target)
+                    raise IncompleteTransfer("server refused to resume the partial download; starting over")
+                response.raise_for_status()
+                await self.save_response_async(response, patent_number, target, offset=offset, url=pdf_url)
+            return True
+
+        try:
+            return await self.with_retries_async(patent_number, pdf_url, fetch_pdf)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log(f"  ERROR downloading PDF: {e}")
+            raise
+
+    async def save_response_async(self, response, patent_number, filename=None, offset=0, url=None):
+        """Stream an aiohttp response body to filename (default <output_dir>/<patent_number>.pdf)
+
+        iter_any hands over whatever has arrived in one piece; the writer's
+        buffer turns those into large writes.
+        """
+        watchdog = self.transfer_guard()
+        target = filename or self.pdf_path(patent_number)
+        with self.pdf_writer(target, response.status, response.headers, offset, url) as f:
+            async for chunk in response.content.iter_any():
+                f.write(chunk)
+                if watchdog:
+                    watchdog.feed(len(chunk))
+
+    def create_excel_report(self):
+        """Create initial Excel file with headers and start its row journal"""
+        try:
+            # Finish reports left behind by a run that crashed before writing them
+            for recovered in recover_journals(self.output_dir):
+                self.log(f"Recovered Excel report from previous run: {os.path.basename(recovered)}")
+
+            # Generate filename with timestamp
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            label = f"_{self.run_label}" if self.run_label else ""
+            excel_filename = f"patent_download_report_{timestamp}{label}.xlsx"
+            excel_path = os.path.join(self.output_dir, excel_filename)
+
+            # Rows are appended to a CSV journal as they arrive; the .xlsx is written once at the end
+            self.report = ReportWriter(excel_path).open()
+
+            self.log(f"✅ Excel file created: {excel_filename}")
+            self.log(f"   Rows are journaled to {os.path.basename(self.report.journal_path)} as patents are downloaded...")
+            return excel_path
+
+        except Exception as e:
+            self.log(f"❌ ERROR creating Excel file: {e}")
+            self.report = None
+            return None
+
+    def finalize_excel_report(self):
+        """Write the final Excel report from the journal (no-op if already written)"""
+        report, self.report = self.report, None
+        if not report:
+            return False
+        try:
+            return report.finalize()
+        except Exception as e:
+            self.log(f"Warning: Could not write Excel report, rows kept in {report.journal_path}: {e}")
+            return False
+
+    def download_pdf_direct(self, pdf_url, patent_number, filename=None, cancel=None):
+        """Download PDF directly (to filename if given; cancel is an optional abort Event)
+
+        An earlier attempt's .part is continued with a Range request when
+        the server allows it.
+        """
+        target = filename or self.pdf_path(patent_number)
+
+        def fetch_pdf():
+            if cancel is not None and cancel.is_set():
+                raise HedgeCancelled("download taken over by the other source")
+            offset, headers = resume_request(target, pdf_url)
+            with self.http.get(pdf_url, stream=True, headers=headers or None) as response:
+                if response.status_code == 416:
+                    discard_partial(target)
+                    raise IncompleteTransfer("server refused to resume the partial download; starting over")
+                response.raise_for_status()
+                self.save_response(response, target, cancel, offset=offset, url=pdf_url)
+            return True
+
+        try:
+            return self.with_retries(patent_number, pdf_url, fetch_pdf, cancel=cancel)
+
+        except Exception as e:
+            self.log(f"  ERROR downloading PDF: {e}")
+            raise  # Re-raise the exception so the caller knows it failed
+
+    def pdf_path(self, clean_number):
+        """Where a patent's PDF is saved"""
+        return os.path.join(self.output_dir, f"{clean_number}.pdf")
+
+    def new_deadline(self):
+        """Start a patent's wall-clock budget (None if there is no limit)"""
+        return Deadline(self.patent_timeout) if self.patent_timeout else None
+
+    def transfer_guard(self):
+        """Watchdog for one PDF stream, or None if throughput isn't checked"""
+        if self.min_throughput:
+            return ThroughputWatchdog(self.min_throughput, self.stall_window)
+        return None
+
+    def pdf_writer(self, filename, status, headers, offset=0, url=None):
+        """PdfFileWriter for a response; resumable when url is given and the server supports ranges"""
+        offset, total = resume_position(status, headers, offset)
+        if offset:
+            self.log(f"  Resuming download at {offset // 1024} KB")
+        validator = resume_validator(headers) if url else None
+        return PdfFileWriter(filename, total, offset=offset, resume=(url, validator) if validator else None)
+
+    def save_response(self, response, filename, cancel=None, offset=0, url=None):
+        """Stream a requests response body to filename through a PdfFileWriter
+
+        Stops early if cancel is set, the body isn't a PDF, the stream stalls
+        below the minimum throughput, or the patent's time budget runs out.
+        With url, a failed transfer keeps its .part for a Range resume, and
+        a 206 response continues the .part from offset.
+        """
+        watchdog = self.transfer_guard()
+        deadline = current_deadline()
+        with self.pdf_writer(filename, response.status_code, response.headers, offset, url) as f:
+            for chunk in iter_response_chunks(response, check_in=lambda: next_check_in(watchdog, deadline)):
+                if cancel is not None and cancel.is_set():
+                    raise HedgeCancelled("download taken over by the other source")
+                f.write(chunk)
+                if watchdog:
+                    watchdog.feed(len(chunk))
+                if deadline:
+                    deadline.check()
+
+    def print_to_pdf(self, driver, filename):
+        """Print the page loaded in driver to a PDF at filename"""
+        try:
+            import base64
+            pdf_data = driver.execute_cdp_cmd("Page.printToPDF", {
+                "printBackground": True,
+                "landscape": False,
+                "paperWidth": 8.5,
+                "paperHeight": 11,
+                "marginTop": 0.4,
+                "marginBottom": 0.4,
+                "marginLeft": 0.4,
+                "marginRight": 0.4
+            })
+
+            with PdfFileWriter(filename) as f:
+                f.write(base64.b64decode(pdf_data['data']))
+            return True
+
+        except Exception as e:
+            self.log(f"  ERROR printing to PDF: {e}")
+            raise  # Re-raise the exception so the caller knows it failed
+
+    def try_browser_render(self, patent_number, add_row=True):
+        """Last resort: render the Google Patents page in headless Chrome and print it to PDF
+
+        Only used once Google Patents and FreePatentsOnline have both failed,
+        and only if the run has a browser pool. Returns the report row on
+        success, else False.
+        """
+        if not self.browser_pool:
+            return False
+        clean_number = self.clean_patent_number(patent_number)
+        url = f"https://patents.google.com/patent/{self.page_candidates(patent_number)[0]}/en"
+        try:
+            self.log(f"  Rendering the Google Patents page in Chrome...")
+            with self.browser_pool.browser() as driver:
+                deadline = current_deadline()
+                if deadline:
+                    deadline.check()
+                    driver.set_page_load_timeout(deadline.cap(PAGE_LOAD_TIMEOUT))
+                driver.get(url)
+                html = driver.page_source
+                self.print_to_pdf(driver, self.pdf_path(clean_number))
+                if deadline:
+                    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+
+            patent_info = self.extract_patent_info(patent_number, html)
+            patent_info['Download Status'] = 'Success (printed from Chrome)'
+            self.log(f"  Printed the rendered page to PDF")
+            if add_row:
+                self.add_patent_info(patent_info)
+            return patent_info
+
+        except Exception as e:
+            self.log(f"  Chrome rendering failed: {e}")
+            return False
+
+    async def try_browser_render_async(self, patent_number, add_row=True):
+        """try_browser_render on a thread, so the event loop keeps running while Chrome works"""
+        if not self.browser_pool:
+            return False
+        call = functools.partial(contextvars.copy_context().run, self.try_browser_render, patent_number, add_row)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    def run(self, input_file, column_name=DEFAULT_COLUMN, shard=None):
+        """Main download process
+
+        The input is read lazily, so downloads start as soon as the first
+        numbers are in. shard=(k, n) processes only every n-th number starting
+        at the k-th (1-based), to split one list across processes.
+        Returns a summary dict; 'total' is 0 when no patent numbers were found.
+        """
+        self.failed_patents = []
+        self.patent_info_list = []
+        self._stop_requested = False
+        reader = None
+        summary = {
+            'total': 0, 'successful': 0, 'failed': 0, 'skipped': 0, 'duplicates': 0, 'malformed': 0,
+            'stopped': False, 'excel_path': None, 'output_dir': os.path.abspath(self.output_dir), 'failed_patents': []
+        }
+        try:
+            # Log session start to failed patents log
+            failed_logger.info("="*80)
+            failed_logger.info(f"NEW DOWNLOAD SESSION STARTED")
+            failed_logger.info("="*80)
+
+            # Open the input; numbers are pulled from it as the engine needs them
+            reader = self.read_patent_numbers(input_file, column_name)
+            if reader is None:
+                self.log("No patent numbers found!")
+                return summary
+
+            read_count = 0
+            input_done = False
+            estimated_total = reader.estimated_total
+            if shard and estimated_total is not None:
+                estimated_total = -(-estimated_total // shard[1])
+
+            def input_numbers():
+                nonlocal read_count, input_done
+                for i, patent_number in enumerate(reader):
+                    if shard and i % shard[1] != shard[0] - 1:
+                        continue
+                    read_count += 1
+                    yield patent_number
+                input_done = True
+                self.log(f"Finished reading input: {read_count} patent numbers")
+
+            def current_total():
+                """Exact once the input is read, the estimate (or count so far) until then"""
+                if input_done:
+                    return read_count
+                return max(read_count, estimated_total or 0)
+
+            patent_numbers = input_numbers()
+            first = next(patent_numbers, None)
+            if first is None:
+                self.log("No patent numbers found!")
+                return summary
+            patent_numbers = itertools.chain([first], patent_numbers)
+
+            # Create Excel file first (rows are journaled as we go)
+            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+            self.log("\nCreating Excel report file...")
+            excel_path = self.create_excel_report()
+
+            # Direct download mode - Chrome is at most a last resort
+            mode_text = "FETCH DETAILS ONLY" if self.fetch_only else "DOWNLOAD PDF + DETAILS"
+            self.log(f"Mode: {mode_text}")
+            self.log("Direct download/fetch mode - using requests")
+            self.log("Failed items will be logged to failed_patents.log")
+            if excel_path:
+                self.log(f"Excel report will be written when the run finishes: {os.path.basename(excel_path)}\n")
+
+            # One pooled keep-alive session shared by every worker, paced per host
+            self.rate_limiter = RateLimiter(self.host_limits)
+            self.retry_policy = RetryPolicy(self.max_retries)
+            if self._stop_requested:
+                self.retry_policy.cancel()
+
+            # Kind codes that worked in earlier runs are tried first when a page isn't found
+            self.kind_resolver = KindCodeResolver(os.path.join(self.output_dir, KIND_CODES_FILENAME)).load()
+            if self.use_cache:
+                self.cache = ResponseCache(os.path.join(self.output_dir, CACHE_DIRNAME), ttl=self.cache_ttl)
+
+            # Full BeautifulSoup parses are CPU-bound; worker processes sidestep the GIL
+            if self.parse_processes:
+                self.parse_pool = ProcessPoolExecutor(max_workers=self.parse_processes)
+                self.log(f"Parsing pages in {self.parse_processes} worker process(es)")
+
+            # Hedging starts FreePatentsOnline once Google is slower than its recent p95
+            if self.hedge and not self.fetch_only:
+                self.google_latency = LatencyTracker()
+                if self.engine_class.is_staged:
+                    self.log("Hedged downloads aren't available with the pipeline engine; sources are tried in turn")
+                elif not self.engine_class.is_async:
+                    self.hedge_executor = ThreadPoolExecutor(max_workers=self.hedge_threads(),
+                                                             thread_name_prefix='patent-hedge')
+
+            # Chrome is only started for the first patent that no source has a PDF for
+            if self.browsers and not self.fetch_only:
+                self.browser_pool = BrowserPool(self.start_browser, self.browsers, self.browser_pages, log=self.log)
+                self.log(f"Chrome fallback: up to {self.browsers} headless browser(s), "
+                         f"restarted every {self.browser_pages} pages, "
+                         f"blocking {len(self.blocked_urls)} URL pattern(s) ('{self.browser_block}' profile)")
+
+            # Download/Fetch patents concurrently - results arrive in completion order
+            if self.engine_class.is_async:
+                self.io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix='patent-io')
+                self.async_http = AsyncHttpClient(
+                    concurrency=self.workers, rate_limiter=self.rate_limiter, cache=self.cache,
+                    executor=self.io_executor
+                )
+                self.parse_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                         thread_name_prefix='patent-parser')
+                self.engine = create_engine(
+                    self.download_patent_async, mode=self.engine_class.name, max_workers=self.workers,
+                    startup=self.async_http.open, shutdown=self.async_http.close
+                )
+            elif self.engine_class.is_staged:
+                pool_size = max(self.stage_workers['fetch'], self.stage_workers['pdf'])
+                self.http = HttpClient(pool_size=pool_size, rate_limiter=self.rate_limiter, cache=self.cache)
+                self.engine = create_engine(self.build_stages(), mode=self.engine_class.name)
+            else:
+                # Hedge threads make requests of their own, on top of (and instead of) the workers
+                pool_size = self.hedge_threads() if self.hedge_executor else self.workers
+                self.http = HttpClient(pool_size=pool_size, rate_limiter=self.rate_limiter, cache=self.cache)
+                self.engine = create_engine(self.download_patent, mode=self.engine_class.name,
+                                            max_workers=self.workers)
+            if self._stop_requested:
+                self.engine.stop()
+            if self.engine_class.is_staged:
+                self.log(f"Using the pipeline engine: {self.engine.describe()}\n")
+            else:
+                self.log(f"Using the {self.engine.name} engine with {self.engine.max_workers} concurrent worker(s)\n")
+
+            # Index the output directory once so existing PDFs are skipped without a request
+            self.output_index = OutputIndex(self.output_dir)
+            if not self.fetch_only:
+                indexed = self.output_index.scan()
+                if indexed:
+                    self.log(f"Found {indexed} existing PDF(s) in {self.output_dir}")
+
+            # Job state lets a rerun skip everything an earlier run already finished
+            self.job_state = JobStateStore(os.path.join(self.output_dir, JOB_STATE_FILENAME))
+            finished = set()
+            if self.resume:
+                finished = self.job_state.finished_keys(MODE_FETCH if self.fetch_only else MODE_DOWNLOAD)
+                if finished:
+                    self.log(f"Resume: {len(finished)} patent(s) already finished in earlier runs will be skipped\n")
+
+            successful = 0
+            failed = 0
+            completed = 0
+            skipped = 0
+            started = time.monotonic()
+
+            # Duplicates and malformed numbers are dropped before anything is requested
+            deduper = PatentNumberDeduper()
+
+            def reject_malformed(patent_number):
+                self.log(f"Malformed patent number, not requested: {patent_number}")
+                self.log_failed_patent(patent_number, self.clean_patent_number(patent_number),
+                                       MALFORMED_REASON, None)
+
+            def passed_over():
+                """Input numbers that never reach the engine"""
+                return skipped + deduper.saved
+
+            def remaining_patents():
+                nonlocal skipped
+                for patent_number in deduper.iter_unique(patent_numbers, on_malformed=reject_malformed):
+                    key = self.clean_patent_number(patent_number)
+                    # A "downloaded" record only counts if the PDF is still on disk and intact
+                    if key in finished and (self.fetch_only or self.output_index.is_complete(key)):
+                        skipped += 1
+                        # Keep the report complete with the row saved by the earlier run
+                        info = self.job_state.get_info(key)
+                        if info:
+                            self.add_report_row(info)
+                        continue
+                    yield patent_number
+
+            def on_submit(i, patent_number):
+                self.record_job_state(patent_number, STATUS_PENDING)
+                total = current_total()
+                self.log(f"[{i + passed_over()}/{total if input_done else f'~{total}'}] Downloading: {patent_number}")
+
+            for result in self.engine.run(remaining_patents(), on_submit=on_submit):
+                completed += 1
+                if result.error is not None:
+                    self.log(f"  [{result.item}] ERROR: {result.error}")
+                    self.record_job_state(result.item, STATUS_FAILED, reason=str(result.error))
+
+                if result.value:
+                    successful += 1
+                    self.log(f"  [{result.item}] SUCCESS")
+                else:
+                    failed += 1
+                    self.log(f"  [{result.item}] FAILED")
+
+                total = current_total()
+                done = completed + passed_over()
+                self.listener.status(f"Completed {done}/{total}: {result.item}", 'downloading')
+                self.listener.progress(done, total)
+                self.listener.result(result.index + passed_over(), result.item, bool(result.value), result.error)
+
+            # A stopped run may not have read the whole input; fall back to the estimate then
+            total = current_total()
+            duplicates, malformed = deduper.duplicates, deduper.malformed
+            failed += malformed
+            if passed_over() or not self.engine.stopped:
+                self.listener.progress(completed + passed_over(), total)
+
+            stopped = self.engine.stopped
+            if stopped:
+                self.log("Download stopped by user")
+
+            # Write the Excel report once, now that every row is in
+            if excel_path and not self.finalize_excel_report():
+                excel_path = None
+
+            # Summary
+            self.log("\n" + "="*50)
+            self.log("DOWNLOAD COMPLETE!")
+            self.log("="*50)
+            if input_done:
+                self.log(f"Total patents:  {total}")
+            else:
+                self.log(f"Total patents:  ~{total} (input not fully read, {read_count} read)")
+            self.log(f"Successful:     {successful}")
+            self.log(f"Failed:         {failed}")
+            if skipped:
+                self.log(f"Skipped:        {skipped} (finished in earlier runs)")
+            if deduper.saved:
+                self.log(f"Not requested:  {deduper.saved} ({duplicates} duplicate, {malformed} malformed)")
+            if failed > 0:
+                self.log(f"Failed patents logged to: failed_patents.log")
+                self.log("Failed Patent Numbers:")
+                for fail in self.failed_patents:
+                    self.log(f" - {fail['original']}")
+            if excel_path:
+                self.log(f"Excel report saved: {os.path.basename(excel_path)}")
+            hedge_stats = self.google_latency.summary() if self.google_latency else None
+            if hedge_stats:
+                self.log(f"Hedged:         {hedge_stats.get('hedged', 0)} slow download(s); PDFs from "
+                         f"Google {hedge_stats.get('google_won', 0)}, FreePatentsOnline {hedge_stats.get('fpo_won', 0)}")
+            retry_stats = self.retry_policy.stats()
+            if retry_stats['retries'] or retry_stats['gave_up']:
+                reasons = ", ".join(f"{reason} x{count}" for reason, count in sorted(retry_stats['reasons'].items()))
+                self.log(f"Retries:        {retry_stats['retries']} ({retry_stats['recovered']} recovered, "
+                         f"{retry_stats['gave_up']} gave up; {reasons or 'none'})")
+            elapsed = time.monotonic() - started
+            self.log(f"Elapsed:        {elapsed:.1f}s ({self.engine.name} engine, {self.engine.max_workers} workers)")
+            self.log("="*50)
+
+            summary.update({
+                'total': total, 'input_complete': input_done,
+                'successful': successful, 'failed': failed, 'skipped': skipped,
+                'duplicates': duplicates, 'malformed': malformed, 'stopped': stopped, 'excel_path': excel_path,
+                'engine': self.engine.name, 'workers': self.engine.max_workers, 'elapsed': round(elapsed, 2),
+                'retries': retry_stats,
+                'hedging': hedge_stats,
+                'browsers': self.browser_pool.stats() if self.browser_pool else None,
+                'failed_patents': [fail['original'] for fail in self.failed_patents]
+            })
+            return summary
+
+        finally:
+            if reader:
+                reader.close()
+            self.finalize_excel_report()
+            if self.cache:
+                self.log(f"Page cache: {self.cache.stats()}")
+                self.cache.close()
+                self.cache = None
+            if self.parse_executor:
+                self.parse_executor.shutdown(wait=True)
+                self.parse_executor = None
+            if self.io_executor:
+                self.io_executor.shutdown(wait=True)
+                self.io_executor = None
+            if self.parse_pool:
+                self.parse_pool.shutdown(wait=True)
+                self.parse_pool = None
+            if self.hedge_executor:
+                self.hedge_executor.shutdown(wait=True)
+                self.hedge_executor = None
+            self.google_latency = None
+            self.async_http = None
+            if self.job_state:
+                self.job_state.close()
+                self.job_state = None
+            self.output_index = None
+            if self.kind_resolver:
+                try:
+                    self.kind_resolver.save()
+                except OSError as e:
+                    self.log(f"Warning: Could not save learned kind codes: {e}")
+                self.kind_resolver = None
+            self.retry_policy = None
+            self.engine = None
+            if self.http:
+                self.http.close()
+                self.http = None
+            if self.browser_pool:
+                self.browser_pool.close()
+                browser_stats = self.browser_pool.stats()
+                if browser_stats['started']:
+                    self.log(f"Browser(s) closed: {browser_stats}")
+                self.browser_pool = None
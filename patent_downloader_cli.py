@@ -0,0 +1,260 @@
+"""
+Google Patent PDF Downloader - Command Line Version
+Headless batch runs for servers and schedulers, with JSON-lines progress on stdout
+Compatible with Python 3.8+
+"""
+
+import argparse
+import json
+import sys
+import threading
+import signal
+import logging
+from datetime import datetime
+
+from patent_downloader import (
+    PatentDownloader, DownloadListener, configure_logging,
+    DEFAULT_OUTPUT_DIR, DEFAULT_COLUMN, MODE_DOWNLOAD, MODE_FETCH
+)
+from download_engine import ENGINES, DEFAULT_WORKERS, MAX_WORKERS, DEFAULT_ASYNC_CONCURRENCY, MAX_ASYNC_CONCURRENCY
+from http_client import GOOGLE_PATENTS_HOST, PATENT_IMAGES_HOST, FPO_HOST
+from rate_limiter import DEFAULT_HOST_LIMITS
+from response_cache import DEFAULT_TTL
+from retry_policy import DEFAULT_MAX_RETRIES
+from pdf_transfer import DEFAULT_PATENT_BUDGET, DEFAULT_MIN_THROUGHPUT, DEFAULT_STALL_WINDOW
+from browser_pool import BLOCK_PROFILES, DEFAULT_BLOCK_PROFILE, DEFAULT_PAGES_PER_BROWSER
+
+logger = logging.getLogger(__name__)
+
+STAGE_NAMES = ('fetch', 'parse', 'pdf')
+
+EXIT_OK = 0
+EXIT_FAILURES = 1      # Run finished but some patents failed
+EXIT_ERROR = 2         # Nothing was processed (bad input, crash)
+
+
+class JsonLinesListener(DownloadListener):
+    """Writes one JSON object per event to stdout and log lines to stderr"""
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+        self.current = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': datetime.now().isoformat(timespec='seconds')}
+        record.update(fields)
+        with self._lock:
+            sys.stdout.write(json.dumps(record) + '\n')
+            sys.stdout.flush()
+
+    def log(self, message):
+        logger.info(message)
+        if not self.quiet:
+            with self._lock:
+                sys.stderr.write(f"{message}\n")
+                sys.stderr.flush()
+
+    def progress(self, current, total):
+        self.current, self.total = current, total
+
+    def result(self, index, patent_number, success, error):
+        self.emit('result', index=index, patent=str(patent_number), success=success,
+                  error=str(error) if error is not None else None,
+                  completed=self.current, total=self.total)
+
+
+def parse_shard(value):
+    """Parse 'K/N' into (K, N) with 1 <= K <= N"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must look like K/N, e.g. 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("shard K/N needs 1 <= K <= N")
+    return index, count
+
+
+def parse_stage_workers(value):
+    """Parse 'fetch=8,parse=2,pdf=4' into a dict"""
+    workers = {}
+    for part in value.split(','):
+        name, _, count = part.partition('=')
+        name = name.strip()
+        if name not in STAGE_NAMES or not count.strip().isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(
+                f"expected e.g. fetch=8,parse=2,pdf=4 (stages: {', '.join(STAGE_NAMES)})"
+            )
+        workers[name] = int(count)
+    return workers
+
+
+def build_host_limits(args):
+    """Cap the per-host request rates with the --*-rps options"""
+    limits = dict(DEFAULT_HOST_LIMITS)
+    for host, rps in ((GOOGLE_PATENTS_HOST, args.google_rps),
+                      (PATENT_IMAGES_HOST, args.pdf_rps),
+                      (FPO_HOST, args.fpo_rps)):
+        if rps is None:
+            continue
+        limit = dict(limits[host])
+        limit['max_rate'] = rps
+        limit['rate'] = min(limit['rate'], rps)
+        limit['min_rate'] = min(limit['min_rate'], rps)
+        limits[host] = limit
+    return limits
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Download patent PDFs and details from Google Patents without the GUI."
+    )
+    parser.add_argument('input', help="patent list: Excel (.xlsx/.xls), CSV or text file with one number per line")
+    parser.add_argument('-o', '--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f"where PDFs, the report and run state go (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('-c', '--column', default=DEFAULT_COLUMN,
+                        help=f"column holding the patent numbers (default: {DEFAULT_COLUMN!r})")
+    parser.add_argument('-m', '--mode', choices=[MODE_DOWNLOAD, MODE_FETCH], default=MODE_DOWNLOAD,
+                        help="download PDFs + details, or fetch details only (default: download)")
+    parser.add_argument('-e', '--engine', choices=sorted(ENGINES), default='threaded',
+                        help="threaded (one thread per download), asyncio (needs aiohttp; "
+                             "hundreds of downloads on one thread) or pipeline (separate fetch/parse/pdf "
+                             "stages with their own workers) (default: threaded)")
+    parser.add_argument('--stage-workers', type=parse_stage_workers, metavar='STAGE=N,...',
+                        help="pipeline engine threads per stage, e.g. fetch=8,parse=2,pdf=4 "
+                             "(default: --workers for fetch and pdf, half the CPUs for parse)")
+    parser.add_argument('-w', '--workers', type=int,
+                        help=f"concurrent downloads: 1-{MAX_WORKERS} threads (default: {DEFAULT_WORKERS}) or "
+                             f"1-{MAX_ASYNC_CONCURRENCY} coroutines (default: {DEFAULT_ASYNC_CONCURRENCY})")
+    parser.add_argument('--parse-processes', type=int, default=0, metavar='N',
+                        help="parse pages that need the full HTML parser in N worker processes "
+                             "(default: 0, parse in the download threads)")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="process every patent even if an earlier run finished it")
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help="only process every N-th patent starting at the K-th, to split a list across processes")
+    parser.add_argument('--retries', type=int, default=DEFAULT_MAX_RETRIES, metavar='N',
+                        help=f"extra attempts after a timeout, dropped connection, 429 or 5xx; 404s are never "
+                             f"retried (default: {DEFAULT_MAX_RETRIES})")
+    parser.add_argument('--patent-timeout', type=float, default=DEFAULT_PATENT_BUDGET, metavar='SECONDS',
+                        help=f"give up on a patent after this long across all sources and retries, 0 for no limit "
+                             f"(default: {DEFAULT_PATENT_BUDGET:g})")
+    parser.add_argument('--min-kbps', type=float, default=DEFAULT_MIN_THROUGHPUT / 1024, metavar='KB/S',
+                        help=f"abort and retry a PDF transfer that averages less than this over --stall-seconds, "
+                             f"0 to disable (default: {DEFAULT_MIN_THROUGHPUT / 1024:g})")
+    parser.add_argument('--stall-seconds', type=float, default=DEFAULT_STALL_WINDOW, metavar='SECONDS',
+                        help=f"window for --min-kbps (default: {DEFAULT_STALL_WINDOW:g})")
+    parser.add_argument('--hedge', action='store_true',
+                        help="also start the FreePatentsOnline download once Google Patents is slower than "
+                             "its recent p95, and keep whichever PDF arrives first (threaded and asyncio engines)")
+    parser.add_argument('--browsers', type=int, default=0, metavar='N',
+                        help="as a last resort, print the Google Patents page to PDF in up to N headless Chrome "
+                             "instances, started only when a patent needs one (default: 0, off)")
+    parser.add_argument('--browser-pages', type=int, default=DEFAULT_PAGES_PER_BROWSER, metavar='N',
+                        help=f"restart each browser after N pages to keep its memory in check "
+                             f"(default: {DEFAULT_PAGES_PER_BROWSER})")
+    parser.add_argument('--browser-block', choices=list(BLOCK_PROFILES), default=DEFAULT_BLOCK_PROFILE,
+                        help=f"what Chrome doesn't download when rendering: 'minimal' blocks images, fonts, media "
+                             f"and trackers, 'drawings' keeps images, 'trackers' blocks only analytics and ads "
+                             f"(default: {DEFAULT_BLOCK_PROFILE})")
+    parser.add_argument('--block-url', action='append', default=[], metavar='PATTERN',
+                        help="also block URLs matching PATTERN ('*' wildcards), e.g. '*.css*'; repeatable")
+    parser.add_argument('--allow-url', action='append', default=[], metavar='PATTERN',
+                        help="drop PATTERN from the blocked list, e.g. '*.svg*' with --browser-block minimal; repeatable")
+    parser.add_argument('--google-rps', type=float, metavar='RPS',
+                        help="max requests/second to patents.google.com")
+    parser.add_argument('--pdf-rps', type=float, metavar='RPS',
+                        help="max requests/second to patentimages.storage.googleapis.com")
+    parser.add_argument('--fpo-rps', type=float, metavar='RPS',
+                        help="max requests/second to freepatentsonline.com")
+    parser.add_argument('--cache-ttl', type=float, metavar='HOURS', default=DEFAULT_TTL / 3600,
+                        help=f"serve cached Google Patents pages without revalidation for this long "
+                             f"(default: {DEFAULT_TTL / 3600:g})")
+    parser.add_argument('--no-cache', action='store_true', help="don't use the on-disk page cache")
+    parser.add_argument('-q', '--quiet', action='store_true', help="don't echo the run log to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    for rps in (args.google_rps, args.pdf_rps, args.fpo_rps):
+        if rps is not None and rps <= 0:
+            build_parser().error("--*-rps values must be positive")
+    if args.retries < 0:
+        build_parser().error("--retries can't be negative")
+    if args.patent_timeout < 0 or args.min_kbps < 0 or args.stall_seconds <= 0:
+        build_parser().error("--patent-timeout and --min-kbps can't be negative, --stall-seconds must be positive")
+    if args.browsers < 0 or args.browser_pages < 1:
+        build_parser().error("--browsers can't be negative and --browser-pages must be at least 1")
+
+    configure_logging(console=False)
+    listener = JsonLinesListener(quiet=args.quiet)
+
+    run_label = None
+    if args.shard:
+        run_label = "shard{}of{}".format(*args.shard)
+
+    try:
+        downloader = PatentDownloader(
+            output_dir=args.output_dir,
+            mode=args.mode,
+            workers=args.workers,
+            resume=not args.no_resume,
+            host_limits=build_host_limits(args),
+            use_cache=not args.no_cache,
+            cache_ttl=args.cache_ttl * 3600,
+            run_label=run_label,
+            listener=listener,
+            engine_mode=args.engine,
+            stage_workers=args.stage_workers,
+            parse_processes=args.parse_processes,
+            max_retries=args.retries,
+            hedge=args.hedge,
+            patent_timeout=args.patent_timeout or None,
+            min_throughput=args.min_kbps * 1024,
+            stall_window=args.stall_seconds,
+            browsers=args.browsers,
+            browser_pages=args.browser_pages,
+            browser_block=args.browser_block,
+            block_urls=args.block_url,
+            allow_urls=args.allow_url
+        )
+    except (ValueError, RuntimeError) as e:
+        listener.log(f"ERROR: {e}")
+        return EXIT_ERROR
+
+    # Ctrl+C / SIGTERM stop the run cleanly: queued patents are cancelled, the report is still written.
+    # The handler runs on the main thread between any two bytecodes - possibly while run() holds an
+    # engine or rate limiter lock - so it only sets an event and a helper thread calls stop().
+    stop_requested = threading.Event()
+
+    def stop_when_requested():
+        stop_requested.wait()
+        listener.log("Stopping download...")
+        downloader.stop()
+    threading.Thread(target=stop_when_requested, name='stop-signal', daemon=True).start()
+
+    def request_stop(signum, frame):
+        stop_requested.set()
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    listener.emit('start', input=args.input, output_dir=args.output_dir, mode=args.mode,
+                  engine=args.engine, workers=downloader.workers, shard=args.shard and '/'.join(map(str, args.shard)))
+    try:
+        summary = downloader.run(args.input, column_name=args.column, shard=args.shard)
+    except Exception as e:
+        listener.log(f"ERROR: {e}")
+        listener.emit('error', message=str(e))
+        return EXIT_ERROR
+
+    listener.emit('summary', **summary)
+    if not summary['total']:
+        return EXIT_ERROR
+    return EXIT_FAILURES if summary['failed'] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
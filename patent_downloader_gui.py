@@ -7,20 +7,15 @@ Compatible with Python 3.8+
 import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
-import pandas as pd
-import requests
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-import time
 import os
-from pathlib import Path
+import queue
 import threading
 import logging
-from datetime import datetime
-from bs4 import BeautifulSoup
+from patent_downloader import (
+    PatentDownloader, DownloadListener, configure_logging, DEFAULT_OUTPUT_DIR, MAIN_LOG_FILE, FAILED_LOG_FILE
+)
+from download_engine import DEFAULT_WORKERS, MAX_WORKERS
+from patent_input import INPUT_FILETYPES
 
 # Set console encoding for Windows
 if sys.platform == 'win32':
@@ -30,23 +25,28 @@ if sys.platform == 'win32':
         pass
 
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('patent_download_gui.log'),
-        logging.StreamHandler()
-    ]
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Setup separate logger for failed downloads
-failed_logger = logging.getLogger('failed_patents')
-failed_logger.setLevel(logging.INFO)
-failed_handler = logging.FileHandler('failed_patents.log')
-failed_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-failed_logger.addHandler(failed_handler)
-failed_logger.propagate = False  # Don't propagate to root logger
+UI_POLL_MS = 100            # How often the Tk main loop drains queued updates
+UI_BATCH_LINES = 2000       # Max log lines inserted per drain
+MAX_LOG_LINES = 5000        # Lines kept in the log area; the log file has the full history
+
+
+class GuiDownloadListener(DownloadListener):
+    """Forwards downloader progress to the GUI widgets"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def log(self, message):
+        self.app.log(message)
+
+    def status(self, message, status_type='info'):
+        self.app.update_status(message, status_type)
+
+    def progress(self, current, total):
+        self.app.update_progress(current, total)
 
 
 class PatentDownloaderGUI:
@@ -79,16 +79,20 @@ class PatentDownloaderGUI:
         
         # Variables
         self.excel_file = tk.StringVar()
-        self.output_dir = "downloaded_patents"
+        self.output_dir = DEFAULT_OUTPUT_DIR
         self.is_downloading = False
-        self.driver = None
-        self.failed_patents = []  # Track failed patents
         self.direct_download_first = tk.BooleanVar(value=True)  # Try direct download without Chrome first
-        self.patent_info_list = []  # Store patent information for Excel export
         self.download_mode = tk.StringVar(value="download")  # Default to download mode
+        self.worker_count = tk.IntVar(value=DEFAULT_WORKERS)  # Concurrent downloads
+        self.resume_enabled = tk.BooleanVar(value=True)  # Skip patents finished in earlier runs
+        self.downloader = None  # Core downloader for the run in progress (see patent_downloader.py)
+        self.ui_queue = queue.Queue()  # Log lines and callbacks posted from worker threads
+        self.pending_status = None  # Latest status/progress; only the newest is drawn each drain
+        self.pending_progress = None
         
         # Create GUI
         self.create_widgets()
+        self.root.after(UI_POLL_MS, self.drain_ui_queue)
         
     def create_widgets(self):
         """Create all GUI widgets"""
@@ -272,7 +276,7 @@ class PatentDownloaderGUI:
         
         info_label = tk.Label(
             file_frame,
-            text="💡 Excel file must have a 'Display Key' column with patent numbers",
+            text="💡 Excel/CSV file must have a 'Display Key' column with patent numbers (or a .txt file with one number per line)",
             font=("Segoe UI", 8),
             fg=self.colors['text_secondary'],
             bg=self.colors['surface']
@@ -315,6 +319,33 @@ class PatentDownloaderGUI:
             **radio_style
         ).pack(side=tk.LEFT)
 
+        tk.Checkbutton(
+            mode_frame,
+            text="Resume (skip finished patents)",
+            variable=self.resume_enabled,
+            **radio_style
+        ).pack(side=tk.LEFT, padx=(15, 0))
+
+        tk.Spinbox(
+            mode_frame,
+            from_=1,
+            to=MAX_WORKERS,
+            textvariable=self.worker_count,
+            width=4,
+            font=("Segoe UI", 10),
+            relief=tk.FLAT,
+            highlightthickness=1,
+            highlightbackground=self.colors['border']
+        ).pack(side=tk.RIGHT)
+
+        tk.Label(
+            mode_frame,
+            text="👥 Workers:",
+            font=("Segoe UI", 10, "bold"),
+            bg=self.colors['background'],
+            fg=self.colors['text']
+        ).pack(side=tk.RIGHT, padx=(0, 8))
+
         # Download Button Section (Direct download enabled by default)
         button_frame = tk.Frame(main_frame, bg=self.colors['background'])
         button_frame.pack(fill=tk.X, pady=(5, 10))
@@ -388,7 +419,17 @@ class PatentDownloaderGUI:
             fg=self.colors['text'],
             bg=self.colors['surface']
         )
-        self.status_label.pack(anchor=tk.W, pady=(0, 10))
+        self.status_label.pack(anchor=tk.W, pady=(0, 4))
+        
+        # Per-host request rate / backoff state
+        self.rate_label = tk.Label(
+            progress_frame,
+            text="",
+            font=("Segoe UI", 8),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['surface']
+        )
+        self.rate_label.pack(anchor=tk.W, pady=(0, 10))
         
         # Log area with modern styling
         log_label = tk.Label(
@@ -424,39 +465,86 @@ class PatentDownloaderGUI:
         """Open file dialog to select Excel file"""
         filename = filedialog.askopenfilename(
             title='Select Excel File with Patent Numbers',
-            filetypes=[
-                ('Excel Files', '*.xlsx *.xls'),
-                ('All Files', '*.*')
-            ]
+            filetypes=INPUT_FILETYPES
         )
         if filename:
             self.excel_file.set(filename)
             self.log(f"Selected file: {filename}")
             
     def log(self, message):
-        """Add message to log area"""
-        self.log_text.insert(tk.END, f"{message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        """Add message to log area (safe to call from any thread)"""
+        logger.info(message)
+        self.ui_queue.put(('log', message))
+        
+    def call_in_ui(self, func, *args):
+        """Run func(*args) on the Tk main loop (safe to call from any thread)"""
+        self.ui_queue.put(('call', func, args))
         
     def update_status(self, message, status_type='info'):
-        """Update status label with icon based on type"""
-        icons = {
-            'info': '⏳',
-            'success': '✅',
-            'error': '❌',
-            'downloading': '⬇️',
-            'complete': '🎉'
-        }
-        icon = icons.get(status_type, '⏳')
-        self.status_label.config(text=f"{icon} {message}")
-        self.root.update_idletasks()
+        """Update status label with icon based on type (safe to call from any thread)"""
+        self.pending_status = (message, status_type)
         
     def update_progress(self, current, total):
-        """Update progress bar"""
-        percentage = (current / total * 100) if total > 0 else 0
-        self.progress_var.set(percentage)
-        self.root.update_idletasks()
+        """Update progress bar (safe to call from any thread)"""
+        self.pending_progress = (current, total)
+        
+    def drain_ui_queue(self):
+        """Apply queued updates on the Tk main loop: one log insert and one redraw per tick"""
+        lines = []
+        calls = []
+        try:
+            while len(lines) < UI_BATCH_LINES:
+                item = self.ui_queue.get_nowait()
+                if item[0] == 'log':
+                    lines.append(item[1])
+                else:
+                    calls.append(item)
+        except queue.Empty:
+            pass
+        
+        if lines:
+            self.log_text.insert(tk.END, '\n'.join(lines) + '\n')
+            # Keep the widget small so inserts stay fast however long the run gets. Count the
+            # widget's own lines: one message can span several (tracebacks, multi-line errors)
+            line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+            excess = line_count - MAX_LOG_LINES
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.log_text.see(tk.END)
+        
+        status, self.pending_status = self.pending_status, None
+        if status:
+            message, status_type = status
+            icons = {
+                'info': '⏳',
+                'success': '✅',
+                'error': '❌',
+                'downloading': '⬇️',
+                'complete': '🎉'
+            }
+            icon = icons.get(status_type, '⏳')
+            self.status_label.config(text=f"{icon} {message}")
+        
+        progress, self.pending_progress = self.pending_progress, None
+        if progress:
+            current, total = progress
+            percentage = (current / total * 100) if total > 0 else 0
+            self.progress_var.set(percentage)
+        
+        for _, func, args in calls:
+            func(*args)
+        
+        # Come back sooner if a backlog is still waiting
+        self.root.after(1 if not self.ui_queue.empty() else UI_POLL_MS, self.drain_ui_queue)
+        
+    def refresh_rate_status(self):
+        """Show current per-host request rates, repeating while a download runs"""
+        rate_limiter = self.downloader.rate_limiter if self.downloader else None
+        if rate_limiter:
+            text = rate_limiter.describe()
+            self.rate_label.config(text=f"🚦 {text}" if text else "")
+        if self.is_downloading:
+            self.root.after(1000, self.refresh_rate_status)
         
     def open_output_folder(self):
         """Open the downloads folder in file explorer"""
@@ -467,7 +555,7 @@ class PatentDownloaderGUI:
             
     def open_main_log(self):
         """Open the main log file"""
-        log_file = "patent_download_gui.log"
+        log_file = MAIN_LOG_FILE
         if os.path.exists(log_file):
             try:
                 os.startfile(os.path.abspath(log_file))
@@ -478,7 +566,7 @@ class PatentDownloaderGUI:
             
     def open_failed_log(self):
         """Open the failed patents log file"""
-        log_file = "failed_patents.log"
+        log_file = FAILED_LOG_FILE
         if os.path.exists(log_file):
             try:
                 os.startfile(os.path.abspath(log_file))
@@ -503,564 +591,78 @@ class PatentDownloaderGUI:
             
         # Start download in separate thread
         self.is_downloading = True
-        self.failed_patents = []  # Clear failed patents list
-        self.patent_info_list = []  # Clear patent info list
+        try:
+            workers = int(self.worker_count.get())
+        except (tk.TclError, ValueError):
+            workers = DEFAULT_WORKERS
+        self.downloader = PatentDownloader(
+            output_dir=self.output_dir,
+            mode=self.download_mode.get(),
+            workers=workers,
+            resume=self.resume_enabled.get(),
+            listener=GuiDownloadListener(self)
+        )
         self.download_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
         self.log_text.delete(1.0, tk.END)
         
         download_thread = threading.Thread(target=self.download_patents, daemon=True)
         download_thread.start()
+        self.root.after(1000, self.refresh_rate_status)
         
     def stop_download(self):
         """Stop the download process"""
         self.is_downloading = False
+        if self.downloader:
+            self.downloader.stop()  # Cancel queued patents, let in-flight ones finish
         self.log("Stopping download...")
-        
-    def read_patent_numbers(self, column_name='Display Key'):
-        """Read patent numbers from Excel file"""
-        try:
-            df = pd.read_excel(self.excel_file.get())
-            self.log(f"Excel file loaded. Columns: {df.columns.tolist()}")
-            
-            if column_name not in df.columns:
-                self.log(f"ERROR: Column '{column_name}' not found")
-                self.log(f"Available columns: {df.columns.tolist()}")
-                return []
-            
-            patent_numbers = df[column_name].dropna().tolist()
-            self.log(f"Found {len(patent_numbers)} patent numbers")
-            return patent_numbers
-            
-        except Exception as e:
-            self.log(f"ERROR reading Excel: {e}")
-            return []
-            
-    def setup_driver(self):
-        """Setup Chrome WebDriver"""
-        try:
-            self.log("Initializing Chrome browser...")
-            chrome_options = Options()
-            
-            # Create output directory
-            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
-            
-            # Set download directory
-            prefs = {
-                "download.default_directory": os.path.abspath(self.output_dir),
-                "download.prompt_for_download": False,
-                "download.directory_upgrade": True,
-                "plugins.always_open_pdf_externally": True,
-                "safebrowsing.enabled": True
-            }
-            chrome_options.add_experimental_option("prefs", prefs)
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-            
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.log("Browser initialized successfully!")
-            return True
-            
-        except Exception as e:
-            self.log(f"ERROR: Could not start Chrome browser")
-            self.log(f"Details: {e}")
-            self.log("Make sure Chrome and ChromeDriver are installed")
-            messagebox.showerror(
-                "Browser Error",
-                "Could not start Chrome browser.\n\n"
-                "Required:\n"
-                "1. Google Chrome installed\n"
-                "2. ChromeDriver installed\n\n"
-                "Install: pip install webdriver-manager"
-            )
-            return False
-            
-    def clean_patent_number(self, patent_number):
-        """Clean patent number"""
-        cleaned = str(patent_number).strip()
-        cleaned = cleaned.replace(' ', '').replace('-', '').replace(',', '').replace('/', '')
-        return cleaned
-        
-    def construct_pdf_url(self, patent_number):
-        """Construct direct PDF URL from patent number (works for many patents)"""
-        clean_number = self.clean_patent_number(patent_number)
-        
-        # Google Patents PDF URL pattern
-        # Example: US1234567A -> https://patentimages.storage.googleapis.com/.../US1234567.pdf
-        # This is a common pattern but may not work for all patents
-        
-        # Try to construct the patent page URL first
-        patent_url = f"https://patents.google.com/patent/{clean_number}"
-        
-        # For direct PDF, we'll try common patterns
-        # Pattern 1: Standard format
-        base_url = "https://patentimages.storage.googleapis.com"
-        
-        # Extract country code and number
-        import re
-        match = re.match(r'([A-Z]{2})(\d+)([A-Z]\d*)?', clean_number)
-        if match:
-            country = match.group(1)
-            number = match.group(2)
-            kind = match.group(3) if match.group(3) else ''
-            
-            # Try common PDF URL pattern
-            # Note: The actual hash in the URL is unpredictable, so this is a fallback
-            # We'll need to fetch the page to get the real PDF URL
-            return None  # Return None to indicate we need to fetch the page
-        
-        return None
-        
-    def extract_patent_info(self, patent_number, html_content):
-        """Extract patent information from HTML"""
-        try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Extract title
-            title = "N/A"
-            
-            # Prefer H1 (visual title) as it's usually the translated English version on /en pages
-            h1_tag = soup.find('h1')
-            if h1_tag:
-                title = h1_tag.get_text(strip=True)
-            else:
-                # Fallback to metadata
-                title_tag = soup.find('meta', {'name': 'DC.title'})
-                if title_tag and title_tag.get('content'):
-                    title = title_tag.get('content')
-            
-            # Extract publication date and application date
-            publication_date = "N/A"
-            application_date = "N/A"
-            
-            # Google Patents has TWO DC.date tags:
-            # 1st = Filing/Priority/Application date
-            # 2nd = Publication date
-            date_tags = soup.find_all('meta', {'name': 'DC.date'})
-            if len(date_tags) >= 2:
-                # 1st is Application Date
-                application_date = date_tags[0].get('content', 'N/A')
-                # 2nd is Publication Date
-                publication_date = date_tags[1].get('content', 'N/A')
-            elif len(date_tags) == 1:
-                # If only one date, assume it's publication or use logic to verify
-                # Usually Google Patents lists filing date first if both exist
-                # But for safety, if only one, let's check context or assume publication if it's the only one shown prominently
-                # However, consistent with comment above: 1st is filing. 
-                # Let's try to be smarter or just take it as application date if older?
-                # For simplicity, if only 1 tag, we might miss one. Let's look for other tags.
-                
-                # Check if this single date matches publicationDate in time tag
-                date_val = date_tags[0].get('content', 'N/A')
-                time_pub = soup.find('time', {'itemprop': 'publicationDate'})
-                if time_pub and date_val in str(time_pub):
-                    publication_date = date_val
-                else:
-                    # Fallback to assigning it to application date if we are unsure, or leave as is.
-                    # Let's assign to publication date to be safe as that's the primary need usually
-                    publication_date = date_val
-                    
-                # Try to find filing date from other meta tags if possible
-                meta_filing = soup.find('meta', {'name': 'DC.date.created'})
-                if meta_filing:
-                    application_date = meta_filing.get('content')
-            else:
-                # Fallback: Try to find date in <time> tags
-                time_pub = soup.find('time', {'itemprop': 'publicationDate'})
-                if time_pub:
-                    publication_date = time_pub.get('datetime', time_pub.get_text(strip=True))
-                
-                time_filing = soup.find('time', {'itemprop': 'filingDate'})
-                if time_filing:
-                    application_date = time_filing.get('datetime', time_filing.get_text(strip=True))
-
-            # Clean the title
-            # Remove " - Google Patents" suffix
-            if " - Google Patents" in title:
-                title = title.replace(" - Google Patents", "")
-            
-            # Remove patent number prefix (e.g., "WO2024169908A1 - ")
-            # Use regex to replace "PatentNumber - " with empty string at the start
-            import re
-            clean_num = self.clean_patent_number(patent_number)
-            # Try to match patent number (with or without dashes/spaces) followed by " - "
-            # We use a somewhat broad pattern to catch variations
-            title = re.sub(r'^' + re.escape(clean_num) + r'\s*-\s*', '', title, flags=re.IGNORECASE)
-            # Also catch if the original patent number string was used
-            title = re.sub(r'^' + re.escape(patent_number) + r'\s*-\s*', '', title, flags=re.IGNORECASE)
-            
-            # Additional cleanup for the format "ID - Title" if ID wasn't exactly caught above
-            # Check if title starts with something that looks like a patent ID
-            match = re.match(r'^([A-Z]{2}\d+[A-Z\d]*)\s*-\s*(.+)', title)
-            if match:
-                possible_id = match.group(1)
-                # If the start looks like our patent number (ignoring non-alphanumeric), strip it
-                if self.clean_patent_number(possible_id) == clean_num:
-                    title = match.group(2)
-
-            # Extract Applicant/Assignee
-            applicant = "N/A"
-            
-            # Try to find assignee (most common for granted patents)
-            assignee_elem = soup.find(attrs={"itemprop": "assignee"})
-            if assignee_elem:
-                applicant = assignee_elem.get_text(strip=True)
-            else:
-                # Try applicant (often for applications)
-                applicant_elem = soup.find(attrs={"itemprop": "applicant"})
-                if applicant_elem:
-                    applicant = applicant_elem.get_text(strip=True)
-                else:
-                    # Fallback: Look for "Current Assignee" or "Applicant" in dt tags
-                    for dt in soup.find_all('dt'):
-                        text = dt.get_text(strip=True).lower()
-                        if 'assignee' in text or 'applicant' in text:
-                            dd = dt.find_next_sibling('dd')
-                            if dd:
-                                applicant = dd.get_text(strip=True)
-                                break
             
-            return {
-                'Patent Number': patent_number,
-                'Title': title,
-                'Application Date': application_date,
-                'Publication Date': publication_date,
-                'Applicant/Assignee': applicant,
-                'Download Status': 'Success',
-                'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            
-        except Exception as e:
-            self.log(f"  Warning: Could not extract patent info: {e}")
-            return {
-                'Patent Number': patent_number,
-                'Title': 'N/A',
-                'Application Date': 'N/A',
-                'Publication Date': 'N/A',
-                'Applicant/Assignee': 'N/A',
-                'Download Status': 'Success',
-                'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-    
-    def try_freepatentsonline(self, patent_number):
-        """Try to download from FreePatentsOnline as fallback"""
+    def download_patents(self):
+        """Run the downloader (worker thread) and hand the outcome to the UI"""
+        summary = error = None
         try:
-            clean_number = self.clean_patent_number(patent_number)
-            self.log(f"  Trying FreePatentsOnline...")
-            
-            # FreePatentsOnline URL format
-            # Example: https://www.freepatentsonline.com/US20160122713.pdf
-            fpo_url = f"https://www.freepatentsonline.com/{clean_number}.pdf"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            # Try direct PDF download
-            response = requests.get(fpo_url, headers=headers, timeout=15, stream=True)
-            response.raise_for_status()
-            
-            # Check if it's actually a PDF
-            content_type = response.headers.get('content-type', '')
-            if 'pdf' in content_type.lower():
-                filename = os.path.join(self.output_dir, f"{clean_number}.pdf")
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
-                self.log(f"  Downloaded from FreePatentsOnline!")
-                
-                # Add basic patent info (simplified)
-                patent_info = {
-                    'Patent Number': patent_number,
-                    'Title': 'Downloaded from FreePatentsOnline',
-                    'Application Date': 'N/A',
-                    'Publication Date': 'N/A',
-                    'Applicant/Assignee': 'N/A',
-                    'Download Status': 'Success (FreePatentsOnline)',
-                    'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                self.patent_info_list.append(patent_info)
-                return True
-            
-            return False
-            
+            summary = self.downloader.run(self.excel_file.get())
         except Exception as e:
-            self.log(f"  FreePatentsOnline failed: {e}")
-            return False
-    
-    def try_direct_download(self, patent_number, fetch_only=False):
-        """Try to download patent directly without Chrome"""
-        clean_number = self.clean_patent_number(patent_number)
-        
-        # Method 1: Try to fetch the patent page and extract PDF link using requests
-        try:
-            patent_url = f"https://patents.google.com/patent/{clean_number}/en"
-            action_text = "Fetching details" if fetch_only else "Download"
-            self.log(f"  Trying Google Patents ({action_text})...")
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(patent_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            # Extract patent information for Excel
-            patent_info = self.extract_patent_info(patent_number, response.text)
-            
-            # If fetch only, we are done
-            if fetch_only:
-                patent_info['Download Status'] = 'Details Fetched'
-                self.patent_info_list.append(patent_info)
-                self.log(f"  Details fetched successfully!")
-                return True
-            
-            # Try to find PDF link in the HTML
-            import re
-            pdf_pattern = r'https://patentimages\.storage\.googleapis\.com/[^"\']+\.pdf'
-            pdf_matches = re.findall(pdf_pattern, response.text)
-            
-            if pdf_matches:
-                pdf_url = pdf_matches[0]
-                self.log(f"  Found PDF URL on Google Patents: {pdf_url}")
-                if self.download_pdf_direct(pdf_url, clean_number):
-                    self.log(f"  Google Patents download successful!")
-                    # Add to patent info list
-                    self.patent_info_list.append(patent_info)
-                    return True
-            
-            return False
+            error = e
+            self.log(f"ERROR: {e}")
+        finally:
+            self.call_in_ui(self.download_finished, summary, error)
             
-        except Exception as e:
-            self.log(f"  Google Patents failed: {e}")
-            return False
-        
-    def log_failed_patent(self, original_number, clean_number, reason, url):
-        """Log failed patent to separate log file"""
-        failed_info = {
-            'original': original_number,
-            'cleaned': clean_number,
-            'reason': reason,
-            'url': url
-        }
-        self.failed_patents.append(failed_info)
-        
-        # Log to separate failed patents file
-        failed_logger.info(
-            f"FAILED | Original: {original_number} | Cleaned: {clean_number} | "
-            f"Reason: {reason} | URL: {url}"
-        )
-        
-    def download_patent(self, patent_number):
-        """Download a single patent - Try Google Patents, then FreePatentsOnline"""
-        clean_number = self.clean_patent_number(patent_number)
-        url = f"https://patents.google.com/patent/{clean_number}/en"
-        
-        fetch_only = (self.download_mode.get() == "fetch")
+    def download_finished(self, summary, error):
+        """Report the outcome of a run and re-enable the controls (Tk main loop)"""
+        self.is_downloading = False
+        self.download_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
         
-        # Try Google Patents first
-        if self.try_direct_download(patent_number, fetch_only=fetch_only):
-            return True
+        if error is not None:
+            messagebox.showerror("Error", f"An error occurred:\n{error}")
+            return
         
-        # If fetch only mode, we don't try FPO or other incomplete sources as they don't provide rich metadata
-        if fetch_only:
-             self.log(f"  Could not fetch details from Google Patents")
-             # We could add an entry for failed fetch if desired, but user flow usually implies just logging failure
-             return False
-
-        # If Google Patents failed, try FreePatentsOnline
-        self.log(f"  Google Patents failed, trying FreePatentsOnline...")
-        if self.try_freepatentsonline(patent_number):
-            return True
+        total = summary['total']
+        successful = summary['successful']
+        if not total:
+            messagebox.showerror("Error", "No patent numbers found in Excel file!")
+            return
         
-        # Both sources failed - log it
-        error_msg = "PDF not found on Google Patents or FreePatentsOnline"
-        self.log(f"  FAILED: {error_msg}")
-        self.log_failed_patent(patent_number, clean_number, error_msg, url)
-        return False
-            
-    def create_excel_report(self):
-        """Create initial Excel file with headers"""
-        try:
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            excel_filename = f"patent_download_report_{timestamp}.xlsx"
-            excel_path = os.path.join(self.output_dir, excel_filename)
-            
-            # Create empty DataFrame with simplified headers
-            df = pd.DataFrame(columns=[
-                'Patent Number', 'Title', 'Application Date', 'Publication Date', 'Applicant/Assignee', 'Download Status', 'Download Date'
-            ])
-            
-            # Save initial Excel file
-            df.to_excel(excel_path, index=False, engine='openpyxl')
-            
-            self.log(f"✅ Excel file created: {excel_filename}")
-            self.log(f"   Will update as patents are downloaded...")
-            return excel_path
-            
-        except Exception as e:
-            self.log(f"❌ ERROR creating Excel file: {e}")
-            return None
-    
-    def update_excel_report(self, excel_path):
-        """Update Excel file with current patent information"""
-        try:
-            if not excel_path or not os.path.exists(excel_path):
-                self.log("Excel file not found, skipping update")
-                return False
-            
-            # Create DataFrame from current patent info list
-            df = pd.DataFrame(self.patent_info_list)
-            
-            # Save to Excel (overwrite)
-            df.to_excel(excel_path, index=False, engine='openpyxl')
-            
-            return True
-            
-        except Exception as e:
-            self.log(f"Warning: Could not update Excel: {e}")
-            return False
-    
-    def download_pdf_direct(self, pdf_url, patent_number):
-        """Download PDF directly"""
-        try:
-            response = requests.get(pdf_url, stream=True)
-            response.raise_for_status()
-            
-            filename = os.path.join(self.output_dir, f"{patent_number}.pdf")
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            return True
-                    
-        except Exception as e:
-            self.log(f"  ERROR downloading PDF: {e}")
-            raise  # Re-raise the exception so the caller knows it failed
-            
-    def print_to_pdf(self, patent_number):
-        """Print page to PDF"""
-        try:
-            import base64
-            pdf_data = self.driver.execute_cdp_cmd("Page.printToPDF", {
-                "printBackground": True,
-                "landscape": False,
-                "paperWidth": 8.5,
-                "paperHeight": 11,
-                "marginTop": 0.4,
-                "marginBottom": 0.4,
-                "marginLeft": 0.4,
-                "marginRight": 0.4
-            })
-            
-            filename = os.path.join(self.output_dir, f"{patent_number}.pdf")
-            with open(filename, 'wb') as f:
-                f.write(base64.b64decode(pdf_data['data']))
-            return True
-                
-        except Exception as e:
-            self.log(f"  ERROR printing to PDF: {e}")
-            raise  # Re-raise the exception so the caller knows it failed
-            
-    def download_patents(self):
-        """Main download process"""
-        try:
-            # Log session start to failed patents log
-            failed_logger.info("="*80)
-            failed_logger.info(f"NEW DOWNLOAD SESSION STARTED")
-            failed_logger.info("="*80)
-            
-            # Read patent numbers
-            patent_numbers = self.read_patent_numbers()
-            
-            if not patent_numbers:
-                self.log("No patent numbers found!")
-                messagebox.showerror("Error", "No patent numbers found in Excel file!")
-                self.is_downloading = False
-                self.download_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.DISABLED)
-                return
-                
-            # Create Excel file first (will be updated as we go)
-            self.log("\nCreating Excel report file...")
-            excel_path = self.create_excel_report()
-            
-            # Direct download mode - no browser needed
-            mode_text = "FETCH DETAILS ONLY" if self.download_mode.get() == 'fetch' else "DOWNLOAD PDF + DETAILS"
-            self.log(f"Mode: {mode_text}")
-            self.log("Direct download/fetch mode - using requests")
-            self.log("Failed items will be logged to failed_patents.log")
-            if excel_path:
-                self.log(f"Excel report will be updated in real-time: {os.path.basename(excel_path)}\n")
-                
-            # Download/Fetch each patent
-            successful = 0
-            failed = 0
-            
-            for i, patent_number in enumerate(patent_numbers, 1):
-                if not self.is_downloading:
-                    self.log("Download stopped by user")
-                    break
-                    
-                self.update_status(f"Downloading {i}/{len(patent_numbers)}: {patent_number}", 'downloading')
-                self.log(f"[{i}/{len(patent_numbers)}] Downloading: {patent_number}")
-                
-                if self.download_patent(patent_number):
-                    successful += 1
-                    self.log(f"  SUCCESS")
-                    # Update Excel immediately after successful download
-                    if excel_path:
-                        self.update_excel_report(excel_path)
-                else:
-                    failed += 1
-                    self.log(f"  FAILED")
-                    
-                self.update_progress(i, len(patent_numbers))
-                time.sleep(2)
-            
-            # Summary
-            self.log("\n" + "="*50)
-            self.log("DOWNLOAD COMPLETE!")
-            self.log("="*50)
-            self.log(f"Total patents:  {len(patent_numbers)}")
-            self.log(f"Successful:     {successful}")
-            self.log(f"Failed:         {failed}")
-            if failed > 0:
-                self.log(f"Failed patents logged to: failed_patents.log")
-                self.log("Failed Patent Numbers:")
-                for fail in self.failed_patents:
-                    self.log(f" - {fail['original']}")
-            if excel_path:
-                self.log(f"Excel report saved: {os.path.basename(excel_path)}")
-            self.log("="*50)
-            
-            self.update_status(f"Complete! {successful}/{len(patent_numbers)} successful", 'complete')
-            
-            # Create message with failed patents info
-            message = f"Downloaded {successful} out of {len(patent_numbers)} patents!\n\n"
-            message += f"Files saved in: {os.path.abspath(self.output_dir)}"
-            if excel_path:
-                message += f"\n\n📊 Excel report generated:\n{os.path.basename(excel_path)}"
-            if failed > 0:
-                message += f"\n\n{failed} patent(s) failed to download.\nCheck 'failed_patents.log' for details."
-            
-            messagebox.showinfo("Download Complete", message)
-            
-        except Exception as e:
-            self.log(f"ERROR: {e}")
-            messagebox.showerror("Error", f"An error occurred:\n{e}")
-            
-        finally:
-            if self.driver:
-                self.driver.quit()
-                self.log("Browser closed")
-                
-            self.is_downloading = False
-            self.download_btn.config(state=tk.NORMAL)
-            self.stop_btn.config(state=tk.DISABLED)
+        if not summary.get('input_complete', True):
+            total = f"about {total}"  # Stopped before the whole input was read
+        self.update_status(f"Complete! {successful}/{total} successful", 'complete')
+        
+        # Create message with failed patents info
+        message = f"Downloaded {successful} out of {total} patents!\n\n"
+        if summary['skipped']:
+            message += f"Skipped {summary['skipped']} patent(s) already finished in earlier runs.\n\n"
+        saved = summary['duplicates'] + summary['malformed']
+        if saved:
+            message += (f"Saved {saved} request(s): {summary['duplicates']} duplicate and "
+                        f"{summary['malformed']} malformed patent number(s) were not requested.\n\n")
+        message += f"Files saved in: {summary['output_dir']}"
+        if summary['excel_path']:
+            message += f"\n\n📊 Excel report generated:\n{os.path.basename(summary['excel_path'])}"
+        if summary['failed'] > 0:
+            message += f"\n\n{summary['failed']} patent(s) failed to download.\nCheck '{FAILED_LOG_FILE}' for details."
+        
+        messagebox.showinfo("Download Complete", message)
 
 
 def main():
@@ -0,0 +1,156 @@
+"""
+Streaming patent number input for the Patent Downloader
+Reads one column from .xlsx/.csv/.txt lazily so downloads can start before the whole file is parsed
+"""
+
+import csv
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+CSV_EXTENSIONS = ('.csv', '.tsv')
+TEXT_EXTENSIONS = ('.txt', '.lst')
+INPUT_FILETYPES = [
+    ('Patent lists', '*.xlsx *.xlsm *.xls *.csv *.tsv *.txt'),
+    ('Excel Files', '*.xlsx *.xls'),
+    ('CSV Files', '*.csv *.tsv'),
+    ('Text Files', '*.txt'),
+    ('All Files', '*.*')
+]
+SAMPLE_BYTES = 64 * 1024  # Read to estimate row counts of text formats
+
+
+class ColumnNotFoundError(ValueError):
+    """The requested column isn't in the input's header row"""
+
+    def __init__(self, column_name, columns):
+        super().__init__(f"Column '{column_name}' not found. Available columns: {columns}")
+        self.column_name = column_name
+        self.columns = columns
+
+
+class PatentNumberReader:
+    """Iterate the patent numbers in one column of an input file
+
+    The header is read when the reader is created, so a missing column is
+    reported straight away (ColumnNotFoundError); rows are only read as the iterator is
+    consumed. Blank cells are skipped, like pandas' dropna(). Plain .txt files
+    hold one number per line and have no header; '#' starts a comment.
+    """
+
+    def __init__(self, path, column_name):
+        self.path = path
+        self.column_name = column_name
+        self.columns = []
+        self.estimated_total = None  # Row count guess for progress; None if unknown
+        self._workbook = None
+        self._file = None
+        self._rows = None
+        self._column_index = None
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext in EXCEL_EXTENSIONS:
+            self._open_excel()
+        elif ext in CSV_EXTENSIONS:
+            self._open_csv()
+        elif ext in TEXT_EXTENSIONS:
+            self._open_text()
+        else:
+            # Old .xls and anything else pandas understands - not streamed
+            self._open_with_pandas()
+
+    def _find_column(self, header):
+        self.columns = ['' if name is None else str(name).strip() for name in header]
+        if self.column_name not in self.columns:
+            self.close()
+            raise ColumnNotFoundError(self.column_name, self.columns)
+        self._column_index = self.columns.index(self.column_name)
+
+    def _open_excel(self):
+        # read_only streams rows from the sheet XML instead of building every cell object
+        self._workbook = load_workbook(self.path, read_only=True, data_only=True)
+        sheet = self._workbook.worksheets[0]
+        self._rows = sheet.iter_rows(values_only=True)
+        self._find_column(next(self._rows, ()))
+        if sheet.max_row:
+            self.estimated_total = max(0, sheet.max_row - 1)
+
+    def _open_csv(self):
+        self._file = open(self.path, newline='', encoding='utf-8-sig')
+        sample = self._file.read(SAMPLE_BYTES)
+        self._file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel_tab if self.path.lower().endswith('.tsv') else csv.excel
+        self._rows = csv.reader(self._file, dialect)
+        self._find_column(next(self._rows, []))
+        self.estimated_total = self._estimate_lines(sample, header=True)
+
+    def _open_text(self):
+        self._file = open(self.path, encoding='utf-8-sig')
+        sample = self._file.read(SAMPLE_BYTES)
+        self._file.seek(0)
+        self.columns = [self.column_name]
+        self._column_index = 0
+        self._rows = ([line.split('#', 1)[0]] for line in self._file)
+        self.estimated_total = self._estimate_lines(sample, header=False)
+
+    def _open_with_pandas(self):
+        df = pd.read_excel(self.path)
+        self._find_column(df.columns.tolist())
+        values = df[self.column_name].dropna().tolist()
+        self.estimated_total = len(values)
+        self._column_index = 0
+        self._rows = ([value] for value in values)
+
+    def _estimate_lines(self, sample, header):
+        """Extrapolate the line count from the sample's average line length"""
+        lines = sample.count('\n')
+        if not lines:
+            return 1 if sample.strip() else 0
+        size = os.path.getsize(self.path)
+        if size <= len(sample.encode('utf-8')):
+            estimate = lines + (0 if sample.endswith('\n') else 1)
+        else:
+            estimate = int(size / (len(sample.encode('utf-8')) / lines))
+        return max(0, estimate - (1 if header else 0))
+
+    def __iter__(self):
+        index = self._column_index
+        try:
+            for row in self._rows:
+                if index >= len(row):
+                    continue
+                value = row[index]
+                if value is None:
+                    continue
+                if isinstance(value, str):
+                    value = value.strip()
+                    if not value:
+                        continue
+                elif isinstance(value, float):
+                    if value != value:  # NaN
+                        continue
+                    if value.is_integer():
+                        value = int(value)
+                yield value
+        finally:
+            self.close()
+
+    def close(self):
+        """Release the input file (also done when iteration ends)"""
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,121 @@
+"""
+Patent number helpers for the Patent Downloader
+Cleaning, canonical country/number/kind keys and up-front de-duplication of input lists
+"""
+
+import re
+from itertools import islice
+
+import pandas as pd
+
+NON_KEY_CHARS_RE = re.compile(r'[^A-Za-z0-9]')
+
+# Country code, serial (with an optional series prefix such as RE, PP or D), optional kind code:
+# US1234567B2, USRE49123E1, USD912345S, WO2020123456A1, EP1000000
+PATENT_NUMBER_PATTERN = r'^(?P<country>[A-Z]{2})(?P<number>[A-Z]{0,2}\d{3,})(?P<kind>[A-Z]\d?)?$'
+PATENT_NUMBER_RE = re.compile(PATENT_NUMBER_PATTERN)
+
+FIRST_CHUNK_SIZE = 100    # Small first chunk so the first download starts quickly
+MAX_CHUNK_SIZE = 10000
+
+
+def clean_patent_number(patent_number):
+    """Clean patent number: upper case, separators and punctuation removed"""
+    cleaned = str(patent_number).strip()
+    return NON_KEY_CHARS_RE.sub('', cleaned).upper()
+
+
+def split_patent_number(patent_number):
+    """Return (country, number, kind) for a patent number, or None if it isn't well formed"""
+    match = PATENT_NUMBER_RE.match(clean_patent_number(patent_number))
+    if not match:
+        return None
+    return match.group('country'), match.group('number'), match.group('kind') or ''
+
+
+def normalize_patent_numbers(values):
+    """Vectorized clean + split of many patent numbers
+
+    Returns a DataFrame with one row per input value: original, key (same as
+    clean_patent_number), country, number, kind ('' if none), bare (country +
+    number) and valid.
+    """
+    original = pd.Series(list(values), dtype=object)
+    keys = original.astype(str).str.strip().str.replace(NON_KEY_CHARS_RE.pattern, '', regex=True).str.upper()
+    parts = keys.str.extract(PATENT_NUMBER_PATTERN)
+    frame = pd.DataFrame({
+        'original': original,
+        'key': keys,
+        'country': parts['country'],
+        'number': parts['number'],
+        'kind': parts['kind'].fillna(''),
+    })
+    frame['valid'] = frame['country'].notna()
+    frame['bare'] = frame['country'].fillna('') + frame['number'].fillna('')
+    return frame
+
+
+class PatentNumberDeduper:
+    """Drop duplicate and malformed patent numbers from a (possibly lazy) input
+
+    Numbers are normalized a chunk at a time. A number is a duplicate if its
+    key was already seen. A number without a kind code also stands for the
+    same country + number with one, whichever comes first: "US1234567" and
+    "US 1234567 B2" make one request in either order. Within a chunk the
+    kinded number is kept; if the kind-less one was already requested in an
+    earlier chunk, the first kinded number after it is dropped instead.
+    Different kind codes are different documents and are all kept.
+    """
+
+    def __init__(self):
+        self.seen_keys = set()
+        self.seen_bare = set()
+        self.open_bare = set()  # Kind-less numbers requested without a kinded counterpart yet
+        self.duplicates = 0
+        self.malformed = 0
+
+    @property
+    def saved(self):
+        """Requests avoided so far"""
+        return self.duplicates + self.malformed
+
+    def filter_chunk(self, values):
+        """Return (unique, malformed) lists of original values for one chunk"""
+        frame = normalize_patent_numbers(values)
+        invalid = frame[~frame['valid']]
+        frame = frame[frame['valid']]
+
+        has_kind = frame['kind'] != ''
+        repeated = frame['key'].isin(self.seen_keys) | frame['key'].duplicated()
+        # Kind-less numbers match any number with the same country + number seen so far or in this chunk
+        covered = ~has_kind & (frame['bare'].isin(self.seen_bare) | frame['bare'].isin(frame.loc[has_kind, 'bare']))
+        # A kind-less number already requested covers the first new kinded number for it
+        fresh = has_kind & ~repeated
+        first_fresh = fresh & ~frame['bare'].where(fresh).duplicated()
+        paired = first_fresh & frame['bare'].isin(self.open_bare)
+        keep = ~(repeated | covered | paired)
+
+        unique = frame[keep]
+        self.seen_keys.update(unique['key'])
+        self.seen_keys.update(frame.loc[paired, 'key'])
+        self.seen_bare.update(unique['bare'])
+        self.open_bare.difference_update(frame.loc[paired, 'bare'])
+        self.open_bare.update(unique.loc[unique['kind'] == '', 'bare'])
+        self.duplicates += int((~keep).sum())
+        self.malformed += len(invalid)
+        return unique['original'].tolist(), invalid['original'].tolist()
+
+    def iter_unique(self, values, on_malformed=None):
+        """Yield unique, well-formed values; on_malformed(value) is called for the rest"""
+        iterator = iter(values)
+        chunk_size = FIRST_CHUNK_SIZE
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            unique, malformed = self.filter_chunk(chunk)
+            if on_malformed:
+                for value in malformed:
+                    on_malformed(value)
+            yield from unique
+            chunk_size = min(chunk_size * 4, MAX_CHUNK_SIZE)
@@ -0,0 +1,266 @@
+"""
+Patent metadata extraction for the Patent Downloader
+A fast scan of the <meta>/h1/itemprop region first, full BeautifulSoup parsing only as a fallback
+"""
+
+import html
+import re
+import zlib
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+
+from patent_numbers import clean_patent_number
+
+try:
+    import lxml  # noqa: F401  (only needed by BeautifulSoup)
+    SOUP_PARSER = 'lxml'
+except ImportError:
+    SOUP_PARSER = 'html.parser'
+
+META_TAG_RE = re.compile(r'<meta\s[^>]*>', re.IGNORECASE)
+ATTR_RE = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+HEAD_END_RE = re.compile(r'</head\s*>', re.IGNORECASE)
+H1_RE = re.compile(r'<h1\b[^>]*>(.*?)</h1\s*>', re.IGNORECASE | re.DOTALL)
+ITEMPROP_RE = r'<(\w+)\b[^>]*\bitemprop\s*=\s*["\']{}["\'][^>]*>(.*?)</\1\s*>'
+ASSIGNEE_RE = re.compile(ITEMPROP_RE.format('assignee'), re.IGNORECASE | re.DOTALL)
+APPLICANT_RE = re.compile(ITEMPROP_RE.format('applicant'), re.IGNORECASE | re.DOTALL)
+DT_RE = re.compile(r'<dt\b[^>]*>(.*?)</dt\s*>', re.IGNORECASE | re.DOTALL)
+DD_RE = re.compile(r'\s*(<dd\b[^>]*>)(.*?)</dd\s*>', re.IGNORECASE | re.DOTALL)
+GOOGLE_ASSIGNEE_RE = re.compile(r'\bitemprop\s*=\s*["\']assignee(?:Current|Original)["\']', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]+>')
+PDF_URL_RE = re.compile(r'https://patentimages\.storage\.googleapis\.com/[^"\']+\.pdf')
+
+
+def _text(fragment):
+    """Tag-stripped text of an HTML fragment, joined like get_text(strip=True)"""
+    parts = (html.unescape(part).strip() for part in TAG_RE.split(fragment))
+    return ''.join(part for part in parts if part)
+
+
+def _attrs(tag):
+    return {m.group(1).lower(): html.unescape(m.group(2) if m.group(2) is not None else m.group(3))
+            for m in ATTR_RE.finditer(tag)}
+
+
+def scan_fields(html_content):
+    """Pull title, DC.date values and assignee/applicant with a few targeted regex searches
+
+    Only the <head> is scanned for meta tags, and each body search stops at
+    its first match, so the bulk of the page (description, claims, citations)
+    is never touched when everything sits near the top. Returns a dict; a
+    missing key means the field was not found.
+    """
+    fields = {}
+    head_end = HEAD_END_RE.search(html_content)
+    fields['head_complete'] = head_end is not None
+    head = html_content[:head_end.start()] if head_end else html_content
+
+    dates = []
+    for tag in META_TAG_RE.findall(head):
+        attrs = _attrs(tag)
+        name = attrs.get('name')
+        if name == 'DC.date':
+            dates.append(attrs.get('content', 'N/A'))
+        elif name == 'DC.title' and attrs.get('content') and 'meta_title' not in fields:
+            fields['meta_title'] = attrs['content']
+    fields['dates'] = dates
+
+    body_start = head_end.end() if head_end else 0
+    h1 = H1_RE.search(html_content, body_start)
+    if h1:
+        fields['h1'] = _text(h1.group(1))
+
+    for key, pattern in (('assignee', ASSIGNEE_RE), ('applicant', APPLICANT_RE)):
+        match = pattern.search(html_content, body_start)
+        if match:
+            fields[key] = _text(match.group(2))
+            break
+    else:
+        scan_listed_assignee(html_content, body_start, fields)
+    return fields
+
+
+def scan_listed_assignee(html_content, start, fields):
+    """The full parser's last resort: the <dd> after the first <dt> mentioning an assignee/applicant
+
+    Live Google Patents pages list people as <dt>Current Assignee</dt>
+    <dd itemprop="assigneeCurrent">, so this is where their assignee comes
+    from. Sets 'listed_assignee' (and 'google_assignee' if the <dd> has
+    Google's itemprop); a <dd> that doesn't directly follow its <dt> sets
+    'listed_unclear' so the caller leaves the page to the full parser.
+    """
+    for dt in DT_RE.finditer(html_content, start):
+        label = _text(dt.group(1)).lower()
+        if 'assignee' not in label and 'applicant' not in label:
+            continue
+        dd = DD_RE.match(html_content, dt.end())
+        if not dd:
+            fields['listed_unclear'] = True
+            return
+        fields['listed_assignee'] = _text(dd.group(2))
+        fields['google_assignee'] = GOOGLE_ASSIGNEE_RE.search(dd.group(1)) is not None
+        return
+
+
+def clean_title(title, patent_number):
+    """Remove the ' - Google Patents' suffix and a leading 'PatentNumber - ' prefix"""
+    # Remove " - Google Patents" suffix
+    if " - Google Patents" in title:
+        title = title.replace(" - Google Patents", "")
+
+    # Remove patent number prefix (e.g., "WO2024169908A1 - ")
+    clean_num = clean_patent_number(patent_number)
+    title = re.sub(r'^' + re.escape(clean_num) + r'\s*-\s*', '', title, flags=re.IGNORECASE)
+    # Also catch if the original patent number string was used
+    title = re.sub(r'^' + re.escape(str(patent_number)) + r'\s*-\s*', '', title, flags=re.IGNORECASE)
+
+    # Additional cleanup for the format "ID - Title" if ID wasn't exactly caught above
+    match = re.match(r'^([A-Z]{2}\d+[A-Z\d]*)\s*-\s*(.+)', title)
+    if match:
+        possible_id = match.group(1)
+        # If the start looks like our patent number (ignoring non-alphanumeric), strip it
+        if clean_patent_number(possible_id) == clean_num:
+            title = match.group(2)
+    return title
+
+
+def build_patent_info(patent_number, title, application_date, publication_date, applicant):
+    """Assemble a report row"""
+    return {
+        'Patent Number': patent_number,
+        'Title': clean_title(title, patent_number),
+        'Application Date': application_date,
+        'Publication Date': publication_date,
+        'Applicant/Assignee': applicant,
+        'Download Status': 'Success',
+        'Download Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def extract_fast(patent_number, html_content):
+    """Fast path: return the report row, or None if the page needs the full parser
+
+    Only pages where every field is found the common way (h1 or DC.title, two
+    DC.date tags, an assignee/applicant itemprop or a Current Assignee list
+    entry) are handled here; anything unusual goes to extract_with_soup so
+    results match the full parser.
+    """
+    fields = scan_fields(html_content)
+    if fields.get('h1') == '' or fields.get('listed_unclear'):
+        return None  # Empty visual title or odd <dt>/<dd> layout - let the full parser decide
+    title = fields.get('h1') or fields.get('meta_title')
+    applicant = fields.get('assignee') or fields.get('applicant') or fields.get('listed_assignee')
+    dates = fields['dates']
+    if not title or not applicant or len(dates) < 2:
+        return None
+    # Google Patents has TWO DC.date tags: 1st = application date, 2nd = publication date
+    return build_patent_info(patent_number, title, dates[0], dates[1], applicant)
+
+
+def has_required_fields(html_content, need_pdf_url=True):
+    """True once a (possibly partial) page holds everything extract_fast needs
+
+    Used to cut off streamed downloads: the whole <head> must be present so no
+    DC.date tag can still be missing, and the first h1/assignee/PDF link found
+    in a prefix is the same one the full page would give.
+    """
+    fields = scan_fields(html_content)
+    if not fields['head_complete'] or len(fields['dates']) < 2:
+        return False
+    # The h1 and assignee win over DC.title and applicant, so a prefix is only
+    # conclusive once those have actually been seen. Pages that mark the
+    # assignee up Google's way (itemprop="assigneeCurrent") don't use the
+    # plain itemprops, so their listed assignee is conclusive as well.
+    if not fields.get('h1'):
+        return False
+    if not fields.get('assignee') and not (fields.get('listed_assignee') and fields.get('google_assignee')):
+        return False
+    return not need_pdf_url or PDF_URL_RE.search(html_content) is not None
+
+
+def extract_with_soup(patent_number, html_content, parser=SOUP_PARSER):
+    """Full-tree extraction (the original method), used when the fast scan comes up short"""
+    soup = BeautifulSoup(html_content, parser)
+
+    # Prefer H1 (visual title) as it's usually the translated English version on /en pages
+    title = "N/A"
+    h1_tag = soup.find('h1')
+    if h1_tag:
+        title = h1_tag.get_text(strip=True)
+    else:
+        # Fallback to metadata
+        title_tag = soup.find('meta', {'name': 'DC.title'})
+        if title_tag and title_tag.get('content'):
+            title = title_tag.get('content')
+
+    publication_date = "N/A"
+    application_date = "N/A"
+
+    # Google Patents has TWO DC.date tags:
+    # 1st = Filing/Priority/Application date
+    # 2nd = Publication date
+    date_tags = soup.find_all('meta', {'name': 'DC.date'})
+    if len(date_tags) >= 2:
+        application_date = date_tags[0].get('content', 'N/A')
+        publication_date = date_tags[1].get('content', 'N/A')
+    elif len(date_tags) == 1:
+        # With a single date, treat it as the publication date (the primary need)
+        publication_date = date_tags[0].get('content', 'N/A')
+
+        # Try to find filing date from other meta tags if possible
+        meta_filing = soup.find('meta', {'name': 'DC.date.created'})
+        if meta_filing:
+            application_date = meta_filing.get('content')
+    else:
+        # Fallback: Try to find date in <time> tags
+        time_pub = soup.find('time', {'itemprop': 'publicationDate'})
+        if time_pub:
+            publication_date = time_pub.get('datetime', time_pub.get_text(strip=True))
+
+        time_filing = soup.find('time', {'itemprop': 'filingDate'})
+        if time_filing:
+            application_date = time_filing.get('datetime', time_filing.get_text(strip=True))
+
+    # Try to find assignee (most common for granted patents), then applicant
+    applicant = "N/A"
+    assignee_elem = soup.find(attrs={"itemprop": "assignee"})
+    if assignee_elem:
+        applicant = assignee_elem.get_text(strip=True)
+    else:
+        applicant_elem = soup.find(attrs={"itemprop": "applicant"})
+        if applicant_elem:
+            applicant = applicant_elem.get_text(strip=True)
+        else:
+            # Fallback: Look for "Current Assignee" or "Applicant" in dt tags
+            for dt in soup.find_all('dt'):
+                text = dt.get_text(strip=True).lower()
+                if 'assignee' in text or 'applicant' in text:
+                    dd = dt.find_next_sibling('dd')
+                    if dd:
+                        applicant = dd.get_text(strip=True)
+                        break
+
+    return build_patent_info(patent_number, title, application_date, publication_date, applicant)
+
+
+def extract_patent_info(patent_number, html_content):
+    """Extract the report row for a patent page, fast path first"""
+    return extract_fast(patent_number, html_content) or extract_with_soup(patent_number, html_content)
+
+
+def compress_page(html_content):
+    """Pack a page for extract_compressed (a few hundred KB of HTML shrinks ~10x)"""
+    return zlib.compress(html_content.encode('utf-8'), 1)
+
+
+def extract_compressed(patent_number, compressed_html, parser=SOUP_PARSER):
+    """Process-pool entry point: full extraction from compress_page() bytes, returns a plain dict"""
+    html_content = zlib.decompress(compressed_html).decode('utf-8')
+    return extract_with_soup(patent_number, html_content, parser)
+
+
+def find_pdf_url(html_content):
+    """Return the first patentimages PDF link on the page, or None"""
+    match = PDF_URL_RE.search(html_content)
+    return match.group(0) if match else None
@@ -0,0 +1,376 @@
+"""
+Transfer guards for the Patent Downloader
+Minimum-throughput watchdog, a wall-clock budget per patent and atomic, validated PDF writes
+"""
+
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from hedge import HedgeCancelled
+from output_index import PDF_MAGIC, is_valid_pdf
+
+DEFAULT_MIN_THROUGHPUT = 8 * 1024  # Bytes/second a PDF transfer must keep up...
+DEFAULT_STALL_WINDOW = 20.0        # ...measured over this many seconds
+DEFAULT_PATENT_BUDGET = 180.0      # Seconds per patent, every source and retry included
+PART_SUFFIX = '.part'              # PDFs are written here first and renamed when complete
+RESUME_SUFFIX = '.json'            # <path>.part.json: where an interrupted .part came from
+
+MIN_CHUNK_SIZE = 8 * 1024          # Read size bounds for streamed PDFs
+MAX_CHUNK_SIZE = 1024 * 1024
+MIN_CAPPED_READ = 1024             # Smallest read when a check is about to fall due
+CHUNK_TARGET_SECONDS = 0.1         # Aim for about this long per read at the current throughput
+WRITE_BUFFER_SIZE = 1024 * 1024    # Small network reads are coalesced into writes this big
+
+_current_deadline = ContextVar('patent_deadline', default=None)
+
+
+class TransferStalled(TimeoutError):
+    """A transfer stayed below the minimum throughput for a whole window (transient, retried)"""
+
+
+class PatentBudgetExceeded(Exception):
+    """The patent's wall-clock budget ran out (not retried)"""
+
+
+class Deadline:
+    """Wall-clock budget for one patent"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+    def check(self):
+        """Raise PatentBudgetExceeded once the budget is used up"""
+        if self.expired:
+            raise PatentBudgetExceeded(f"per-patent time budget of {self.seconds:g}s used up")
+
+    def cap(self, timeout):
+        """Shorten a requests timeout ((connect, read) or seconds) to the time left"""
+        remaining = max(0.1, self.remaining())
+        if isinstance(timeout, tuple):
+            return tuple(min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+
+def current_deadline():
+    """The Deadline of the patent being processed in this thread/task, or None"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def patent_deadline(deadline):
+    """Make deadline current for the block (contextvars: per thread and per asyncio task)"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+class ThroughputWatchdog:
+    """Raises TransferStalled when a stream averages under min_rate bytes/s over a window
+
+    feed() is called after every chunk. A connection that sends nothing at
+    all is left to the socket read timeout.
+    """
+
+    def __init__(self, min_rate=DEFAULT_MIN_THROUGHPUT, window=DEFAULT_STALL_WINDOW):
+        self.min_rate = min_rate
+        self.window = window
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+
+    def due_in(self):
+        """Seconds until the current window closes and the rate is judged"""
+        return max(0.0, self.window - (time.monotonic() - self.window_start))
+
+    def feed(self, nbytes):
+        self.window_bytes += nbytes
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed < self.window:
+            return
+        rate = self.window_bytes / elapsed
+        if rate < self.min_rate:
+            raise TransferStalled(f"transfer stalled at {rate / 1024:.1f} KB/s for {elapsed:.0f}s")
+        self.window_start, self.window_bytes = now, 0
+
+
+class AdaptiveChunkSize:
+    """Read size that follows throughput, doubling or halving between the bounds
+
+    Fast links get big reads (few Python iterations per file). A read only
+    returns once it is full, so on a slow link even the minimum can take
+    seconds; within() shrinks it further to what should arrive before the
+    next watchdog or deadline check is due, so those fire close to on time.
+    """
+
+    def __init__(self, minimum=MIN_CHUNK_SIZE, maximum=MAX_CHUNK_SIZE, target=CHUNK_TARGET_SECONDS):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.size = minimum
+        self.rate = None  # Bytes/second of the latest read
+
+    def within(self, seconds):
+        """Read size expected to complete in seconds (None: no limit) at the latest rate"""
+        if seconds is None or self.rate is None:
+            return self.size
+        return max(MIN_CAPPED_READ, min(self.size, int(self.rate * seconds)))
+
+    def update(self, nbytes, seconds):
+        """Adjust after a read of nbytes that took seconds"""
+        if seconds > 0:
+            self.rate = nbytes / seconds
+        wanted = nbytes / seconds * self.target if seconds > 0 else self.maximum
+        if wanted >= self.size * 2:
+            self.size = min(self.size * 2, self.maximum)
+        elif wanted < self.size / 2:
+            self.size = max(self.size // 2, self.minimum)
+
+
+def is_identity_encoded(headers):
+    return headers.get('Content-Encoding', 'identity').lower() in ('', 'identity')
+
+
+def next_check_in(watchdog=None, deadline=None):
+    """Seconds until the watchdog or deadline next needs looking at, or None if neither is set"""
+    waits = [guard for guard in (watchdog and watchdog.due_in(), deadline and deadline.remaining())
+             if guard is not None]
+    return min(waits) if waits else None
+
+
+def iter_response_chunks(response, sizer=None, check_in=None):
+    """Yield a streamed requests response body in adaptively sized chunks
+
+    Unencoded bodies are read with readinto into one reused buffer, and the
+    chunks are memoryviews over it, so each one must be consumed before the
+    next is requested. check_in() returns the seconds until the caller's
+    next check is due (or None); reads are cut to what should arrive by
+    then. Compressed bodies fall back to iter_content, which decodes them.
+    """
+    sizer = sizer or AdaptiveChunkSize()
+    if not is_identity_encoded(response.headers):
+        yield from response.iter_content(chunk_size=sizer.maximum)
+        return
+    view = memoryview(bytearray(sizer.maximum))
+    raw = response.raw
+    while True:
+        started = time.perf_counter()
+        size = sizer.within(check_in()) if check_in else sizer.size
+        count = raw.readinto(view[:size])
+        if not count:
+            return
+        sizer.update(count, time.perf_counter() - started)
+        yield view[:count]
+
+
+class IncompleteTransfer(ConnectionError):
+    """The body ended short of its Content-Length or without a %%EOF trailer (transient, retried)"""
+
+
+class InvalidPdf(ValueError):
+    """The response isn't a PDF, e.g. an HTML error page (not retried)"""
+
+
+def expected_length(headers):
+    """Content-Length of an unencoded body, or None if it can't be checked"""
+    if not is_identity_encoded(headers):
+        return None  # The length counts the compressed bytes, not what we write
+    try:
+        return int(headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        return None
+
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+def resume_validator(headers):
+    """The If-Range value that lets a transfer be resumed later, or None
+
+    Needs byte-range support, an unencoded body and a strong ETag (weak ones
+    can't be used with If-Range) or else a Last-Modified date.
+    """
+    if headers.get('Accept-Ranges', '').lower() != 'bytes' and 'Content-Range' not in headers:
+        return None
+    if not is_identity_encoded(headers):
+        return None
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def discard_partial(path):
+    """Remove <path>.part and its resume record"""
+    for leftover in (path + PART_SUFFIX, path + PART_SUFFIX + RESUME_SUFFIX):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+
+def resume_request(path, url):
+    """Return (offset, headers) to continue an interrupted download of url into path
+
+    (0, {}) if there is nothing usable to resume; a .part left by another URL
+    or without a validator is removed.
+    """
+    part_path = path + PART_SUFFIX
+    try:
+        with open(part_path + RESUME_SUFFIX, encoding='utf-8') as f:
+            record = json.load(f)
+        offset = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        record, offset = None, 0
+    if not record or record.get('url') != url or not record.get('validator') or not offset:
+        discard_partial(path)
+        return 0, {}
+    return offset, {'Range': f'bytes={offset}-', 'If-Range': record['validator']}
+
+
+def resume_position(status, headers, offset):
+    """Return (offset, total length) for writing a response to a ranged request
+
+    A 206 that starts where the .part ends continues it; anything else (the
+    server ignored the range, or If-Range saw a changed file) starts over.
+    """
+    if status != 206:
+        return 0, expected_length(headers)
+    match = CONTENT_RANGE_RE.match(headers.get('Content-Range', ''))
+    if not match or int(match.group(1)) != offset or not is_identity_encoded(headers):
+        raise IncompleteTransfer(f"server resumed at {headers.get('Content-Range')!r}, expected byte {offset}")
+    total = match.group(3)
+    return offset, int(total) if total != '*' else None
+
+
+class PdfFileWriter:
+    """Write a PDF to <path>.part and move it to <path> only once it checks out
+
+    The first bytes must be %PDF (so an HTML error page is rejected before
+    it is downloaded in full). On close the size must match Content-Length
+    when known and the file must end with a %%EOF trailer. Only then is it
+    renamed into place with os.replace, so a <number>.pdf on disk is never
+    partial. On any error the .part file is removed, unless it can be
+    resumed (below).
+
+    Writes go through a 1 MB buffer, and when the length is known the file
+    is preallocated so it is laid out in one piece.
+
+    With resume=(url, validator), a failed transfer - including one that
+    ended short of Content-Length - keeps its .part plus a <path>.part.json
+    record, so resume_request() can continue it with a Range request. Only
+    a body that isn't a PDF, or is longer than announced or lacks %%EOF
+    once complete, is thrown away. offset > 0 appends to such a .part.
+    """
+
+    def __init__(self, path, expected_length=None, offset=0, resume=None):
+        self.path = path
+        self.part_path = path + PART_SUFFIX
+        self.resume_path = self.part_path + RESUME_SUFFIX
+        self.expected_length = expected_length
+        self.offset = offset
+        self.resume = resume
+        self.size = 0
+        self._head = b''
+        self._file = None
+
+    def __enter__(self):
+        if self.offset:
+            self._file = open(self.part_path, 'r+b', buffering=WRITE_BUFFER_SIZE)
+            self._head = self._file.read(len(PDF_MAGIC))
+            self._file.seek(self.offset)
+            self._file.truncate()
+            self.size = self.offset
+        else:
+            self._file = open(self.part_path, 'wb', buffering=WRITE_BUFFER_SIZE)
+            if self.expected_length and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(self._file.fileno(), 0, self.expected_length)
+                except OSError:
+                    pass  # Not supported by this filesystem - just write
+        if self.resume:
+            url, validator = self.resume
+            with open(self.resume_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'validator': validator, 'length': self.expected_length}, f)
+        elif os.path.exists(self.resume_path):
+            os.remove(self.resume_path)
+        return self
+
+    def write(self, data):
+        if len(self._head) < len(PDF_MAGIC):
+            self._head += data[:len(PDF_MAGIC) - len(self._head)]
+            if not PDF_MAGIC.startswith(self._head):
+                raise InvalidPdf(f"response is not a PDF (starts with {self._head!r})")
+        self._file.write(data)
+        self.size += len(data)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # Keep what arrived for a later Range request - unless it's junk or the other source won
+            if self._resumable() and not issubclass(exc_type, (InvalidPdf, HedgeCancelled)):
+                self._keep_part()
+                return False
+            self._file.close()
+            self._discard()
+            return False
+        try:
+            self._check()
+        except IncompleteTransfer:
+            # The connection closed early without an error (urllib3 1.x doesn't enforce
+            # Content-Length): as resumable as a transfer that broke off mid-stream
+            if self._resumable() and self.size < self.expected_length:
+                self._keep_part()
+            else:
+                self._file.close()
+                self._discard()
+            raise
+        except BaseException:
+            self._file.close()
+            self._discard()
+            raise
+        self._file.close()
+        try:
+            os.replace(self.part_path, self.path)
+        except BaseException:
+            self._discard()
+            raise
+        self._discard()  # Only the resume record is left
+        return False
+
+    def _resumable(self):
+        """True if the .part is worth continuing with a Range request"""
+        return bool(self.resume) and self.size > len(PDF_MAGIC) and self._head == PDF_MAGIC
+
+    def _keep_part(self):
+        """Close the .part at the received size, leaving it and its resume record for resume_request()"""
+        self._file.truncate(self.size)  # Drop the preallocated tail so the size is the resume offset
+        self._file.close()
+
+    def _check(self):
+        if self._head != PDF_MAGIC:
+            raise InvalidPdf("response is not a PDF")
+        if self.expected_length is not None and self.size != self.expected_length:
+            raise IncompleteTransfer(f"got {self.size} of {self.expected_length} bytes")
+        self._file.flush()
+        if not is_valid_pdf(self.part_path):
+            raise IncompleteTransfer("PDF has no %%EOF trailer (truncated)")
+
+    def _discard(self):
+        for leftover in (self.part_path, self.resume_path):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
@@ -0,0 +1,175 @@
+"""
+Per-host adaptive rate limiting for the Patent Downloader
+Token buckets whose rate follows AIMD: speed up while a host is happy, back off on 429/5xx
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from http_client import GOOGLE_PATENTS_HOST, PATENT_IMAGES_HOST, FPO_HOST
+
+# Starting rate, floor, ceiling (requests/second) and burst size per host
+DEFAULT_HOST_LIMITS = {
+    GOOGLE_PATENTS_HOST: {'rate': 2.0, 'min_rate': 0.2, 'max_rate': 10.0, 'burst': 2},
+    PATENT_IMAGES_HOST: {'rate': 4.0, 'min_rate': 0.5, 'max_rate': 20.0, 'burst': 4},
+    FPO_HOST: {'rate': 1.0, 'min_rate': 0.1, 'max_rate': 5.0, 'burst': 1},
+}
+DEFAULT_LIMIT = {'rate': 2.0, 'min_rate': 0.2, 'max_rate': 10.0, 'burst': 2}
+
+# Short names used in the GUI status line
+HOST_LABELS = {
+    GOOGLE_PATENTS_HOST: 'Google',
+    PATENT_IMAGES_HOST: 'patentimages',
+    FPO_HOST: 'FPO',
+}
+
+# Status codes that mean "slow down"
+THROTTLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+ADDITIVE_INCREASE = 0.05      # requests/second gained per successful response
+MULTIPLICATIVE_DECREASE = 0.5  # rate multiplier applied on throttling
+MAX_RETRY_AFTER = 120.0        # never honour a Retry-After longer than this (seconds)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(0.0, min(seconds, MAX_RETRY_AFTER))
+
+
+class TokenBucket:
+    """Token bucket for a single host with an AIMD-controlled refill rate"""
+
+    def __init__(self, rate, min_rate, max_rate, burst):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttle_count = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        # ``updated`` may lie in the future while a backoff pause is running
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it
+
+        Tokens may go negative: each caller queues behind the ones before it, so
+        waiters are released one refill interval apart rather than all at once.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1.0
+            wait = max(0.0, self.updated - now)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def on_success(self):
+        """Additive increase"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+
+    def on_throttle(self, retry_after=None):
+        """Multiplicative decrease, plus a hard pause if the server asked for one"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+            self.throttle_count += 1
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            if now + pause > self.blocked_until:
+                # Nothing refills until the pause is over
+                self.blocked_until = now + pause
+                self.tokens = min(self.tokens, 0.0)
+                self.updated = max(self.updated, self.blocked_until)
+
+    def backoff_remaining(self):
+        """Seconds left in the current backoff pause"""
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+class RateLimiter:
+    """Independent adaptive token buckets per host, shared by all workers"""
+
+    def __init__(self, host_limits=None):
+        self.host_limits = dict(DEFAULT_HOST_LIMITS)
+        if host_limits:
+            self.host_limits.update(host_limits)
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+
+    def bucket(self, host):
+        """Return the bucket for a host, creating it on first use"""
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(**self.host_limits.get(host, DEFAULT_LIMIT))
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, host):
+        """Block until a request to host is allowed (returns early once cancelled)"""
+        wait = self.bucket(host).reserve()
+        if wait > 0:
+            self.cancel_event.wait(wait)
+        return wait
+
+    def record(self, host, status_code=None, retry_after=None):
+        """Feed a response back into the host's rate (status_code None = network error)"""
+        bucket = self.bucket(host)
+        if status_code is None or status_code in THROTTLE_STATUS_CODES:
+            bucket.on_throttle(parse_retry_after(retry_after))
+        else:
+            bucket.on_success()
+
+    def cancel(self):
+        """Wake every waiting worker (used when the user presses Stop)"""
+        self.cancel_event.set()
+
+    def snapshot(self):
+        """Return {host: {'rate', 'backoff', 'throttled'}} for display"""
+        with self.lock:
+            buckets = dict(self.buckets)
+        return {
+            host: {
+                'rate': bucket.rate,
+                'backoff': bucket.backoff_remaining(),
+                'throttled': bucket.throttle_count,
+            }
+            for host, bucket in buckets.items()
+        }
+
+    def describe(self):
+        """One-line summary of current rates and backoff per host"""
+        parts = []
+        for host, state in sorted(self.snapshot().items()):
+            text = f"{HOST_LABELS.get(host, host)} {state['rate']:.1f} req/s"
+            if state['backoff'] > 0:
+                text += f" (backoff {state['backoff']:.0f}s)"
+            elif state['throttled']:
+                text += f" ({state['throttled']} throttled)"
+            parts.append(text)
+        return " | ".join(parts)
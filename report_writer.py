@@ -0,0 +1,206 @@
+"""
+Streaming Excel report writer for the Patent Downloader
+Rows are journaled to a CSV file as they arrive; the .xlsx is written once when the run ends
+"""
+
+import csv
+import glob
+import os
+import threading
+import time
+
+from openpyxl import Workbook
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+REPORT_COLUMNS = [
+    'Patent Number', 'Title', 'Application Date', 'Publication Date',
+    'Applicant/Assignee', 'Download Status', 'Download Date'
+]
+
+JOURNAL_SUFFIX = '.journal.csv'
+LOCK_SUFFIX = '.lock'  # <journal>.lock is held by the process writing the journal
+
+
+def journal_path_for(excel_path):
+    """Return the CSV journal path that belongs to an .xlsx report"""
+    return os.path.splitext(excel_path)[0] + JOURNAL_SUFFIX
+
+
+def lock_journal(journal_path):
+    """Take the journal's lock file; returns the open lock file, or None if a live process holds it
+
+    The OS drops the lock when its holder exits, so a journal whose lock
+    can be taken belongs to no running process. unlock_journal() removes the
+    lock file while still holding it, so a lock taken on a file that has
+    since been unlinked (or replaced) is dropped and taken again on the file
+    now at the path.
+    """
+    lock_path = journal_path + LOCK_SUFFIX
+    while True:
+        lock_file = open(lock_path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return None
+        if _same_file(lock_file, lock_path):
+            return lock_file
+        lock_file.close()
+
+
+def _same_file(lock_file, lock_path):
+    """True if lock_path still names the file lock_file has open"""
+    try:
+        return os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path))
+    except OSError:
+        return False
+
+
+def unlock_journal(journal_path, lock_file):
+    """Release a lock from lock_journal()
+
+    The lock file is removed while the lock is still held, so no other
+    process can have locked it in between; lock_journal() notices if it
+    locked the file just before it was removed. Windows can't remove an open
+    file, so there the lock file is left in place for the next run.
+    """
+    if fcntl is not None:
+        try:
+            os.remove(journal_path + LOCK_SUFFIX)
+        except OSError:
+            pass
+    lock_file.close()
+
+
+def write_xlsx(excel_path, rows, columns=REPORT_COLUMNS):
+    """Write rows (dicts) to an .xlsx in one streaming pass, replacing the file atomically"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([row.get(column, '') for column in columns])
+
+    temp_path = excel_path + '.tmp'
+    workbook.save(temp_path)
+    os.replace(temp_path, excel_path)
+
+
+class ReportWriter:
+    """Append-only report sink
+
+    Every row is appended to the CSV journal and handed to the OS straight away,
+    so a crash of the app never loses a finished patent. The journal is fsynced
+    every ``flush_rows`` rows or ``flush_interval`` seconds, whichever comes
+    first. finalize() converts the journal into the .xlsx once and removes it.
+    The journal's lock file is held until then, so recover_journals() in
+    another run sharing the output directory leaves it alone.
+    """
+
+    def __init__(self, excel_path, columns=REPORT_COLUMNS, flush_rows=50, flush_interval=5.0):
+        self.excel_path = excel_path
+        self.journal_path = journal_path_for(excel_path)
+        self.columns = list(columns)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.row_count = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = None
+        self._writer = None
+        self._journal_lock = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Create the journal and an empty .xlsx with headers"""
+        # Locked before the journal exists, so no other run can mistake it for a crashed one's
+        self._journal_lock = lock_journal(self.journal_path)
+        if self._journal_lock is None:
+            raise OSError(f"{self.journal_path} is in use by another process")
+        write_xlsx(self.excel_path, [], self.columns)
+        self._file = open(self.journal_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore')
+        self._writer.writeheader()
+        self._sync()
+        return self
+
+    def append(self, row):
+        """Journal one report row (safe to call from any thread)"""
+        with self._lock:
+            if self._writer is None:
+                return
+            self._writer.writerow(row)
+            self._file.flush()
+            self.row_count += 1
+            self._unsynced += 1
+            if (self._unsynced >= self.flush_rows or
+                    time.monotonic() - self._last_sync >= self.flush_interval):
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def finalize(self):
+        """Close the journal, write the .xlsx once and drop the journal
+
+        If the .xlsx cannot be written the journal is kept, so the rows can be
+        recovered by finalize_journal() on the next run.
+        """
+        with self._lock:
+            if self._file is None:
+                return False
+            self._sync()
+            self._file.close()
+            self._file = None
+            self._writer = None
+        try:
+            return finalize_journal(self.journal_path, self.excel_path, self.columns)
+        finally:
+            unlock_journal(self.journal_path, self._journal_lock)
+            self._journal_lock = None
+
+
+def finalize_journal(journal_path, excel_path=None, columns=REPORT_COLUMNS):
+    """Convert a CSV journal into its .xlsx report and delete the journal"""
+    if excel_path is None:
+        excel_path = journal_path[:-len(JOURNAL_SUFFIX)] + '.xlsx'
+    with open(journal_path, newline='', encoding='utf-8') as f:
+        write_xlsx(excel_path, csv.DictReader(f), columns)
+    os.remove(journal_path)
+    return True
+
+
+def recover_journals(output_dir, columns=REPORT_COLUMNS):
+    """Finalize journals left behind by a crashed run; returns the recovered .xlsx paths
+
+    Journals whose lock is held belong to a run that is still going (e.g.
+    another --shard on the same output directory) and are skipped.
+    """
+    recovered = []
+    for journal_path in glob.glob(os.path.join(output_dir, '*' + JOURNAL_SUFFIX)):
+        excel_path = journal_path[:-len(JOURNAL_SUFFIX)] + '.xlsx'
+        try:
+            lock_file = lock_journal(journal_path)
+        except OSError:
+            continue
+        if lock_file is None:
+            continue
+        try:
+            finalize_journal(journal_path, excel_path, columns)
+            recovered.append(excel_path)
+        except (OSError, csv.Error):
+            continue
+        finally:
+            unlock_journal(journal_path, lock_file)
+    return recovered
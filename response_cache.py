@@ -0,0 +1,155 @@
+"""
+On-disk HTTP response cache for the Patent Downloader
+Keeps Google Patents detail pages zlib-compressed on disk with TTL, ETag revalidation and LRU eviction
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+CACHE_DIRNAME = '.http_cache'
+DEFAULT_TTL = 24 * 60 * 60              # Serve without revalidation for a day
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024   # Compressed bytes kept on disk
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url           TEXT PRIMARY KEY,
+    filename      TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    stored_at     REAL NOT NULL,
+    last_access   REAL NOT NULL,
+    size          INTEGER NOT NULL,
+    partial       INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# fresh=False means the body may be served only after a successful revalidation;
+# partial=True means only the head of the page was downloaded
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'last_modified', 'fresh', 'partial'])
+
+
+class ResponseCache:
+    """Size-bounded, compressed, persistent cache of response bodies keyed by URL"""
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.refreshed = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'),
+                                     timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(entries)')]
+        if 'partial' not in columns:
+            self._conn.execute('ALTER TABLE entries ADD COLUMN partial INTEGER NOT NULL DEFAULT 0')
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _path(self, filename):
+        return os.path.join(self.cache_dir, filename)
+
+    def lookup(self, url):
+        """Return a CachedResponse for url, or None if it isn't cached"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT filename, etag, last_modified, stored_at, partial FROM entries WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            filename, etag, last_modified, stored_at, partial = row
+            try:
+                with open(self._path(filename), 'rb') as f:
+                    body = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self._delete(url, filename)
+                self.misses += 1
+                return None
+            now = time.time()
+            self._conn.execute('UPDATE entries SET last_access = ? WHERE url = ?', (now, url))
+            fresh = self.ttl is not None and now - stored_at < self.ttl
+            if fresh:
+                self.hits += 1
+            return CachedResponse(body, etag, last_modified, fresh, bool(partial))
+
+    def conditional_headers(self, cached):
+        """Request headers that let the server answer 304 Not Modified"""
+        headers = {}
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+        return headers
+
+    def mark_revalidated(self, url):
+        """Restart an entry's TTL after the server answered 304"""
+        with self._lock:
+            self.revalidated += 1
+            now = time.time()
+            self._conn.execute(
+                'UPDATE entries SET stored_at = ?, last_access = ? WHERE url = ?', (now, now, url)
+            )
+
+    def store(self, url, body, etag=None, last_modified=None, partial=False):
+        """Compress and store a response body, evicting least recently used entries if needed"""
+        filename = hashlib.sha1(url.encode('utf-8')).hexdigest() + '.z'
+        data = zlib.compress(body, 6)
+        temp_path = self._path(f"{filename}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self._path(filename))
+
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+                self.refreshed += 1
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, filename, etag, last_modified, now, now, len(data), int(partial))
+            )
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes (lock held)"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT url, filename, size FROM entries ORDER BY last_access')
+        for url, filename, size in rows.fetchall():
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._delete(url, filename, size)
+
+    def _delete(self, url, filename, size=None):
+        if size is None:
+            row = self._conn.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+            size = row[0] if row else 0
+        self._conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(filename))
+        except OSError:
+            pass
+
+    def stats(self):
+        """One-line hit/miss summary for the run log"""
+        return (f"{self.hits} hit(s), {self.revalidated} revalidated, {self.refreshed} refreshed, "
+                f"{self.misses} miss(es), "
+                f"{self._total_bytes / (1024 * 1024):.1f} MB on disk")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,190 @@
+"""
+Retry policy for the Patent Downloader
+Classifies failures as transient or permanent and retries transient ones with exponential backoff and full jitter
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from pdf_transfer import current_deadline
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+TRANSIENT = 'transient'   # Worth another try: timeouts, dropped connections, 429, 5xx
+PERMANENT = 'permanent'   # Retrying won't help: 404, other 4xx, bad responses
+
+DEFAULT_MAX_RETRIES = 2    # Extra attempts after the first one
+DEFAULT_BASE_DELAY = 1.0   # Seconds; the backoff ceiling doubles with every retry
+DEFAULT_MAX_DELAY = 30.0
+CANCEL_POLL_INTERVAL = 0.25  # How often an asyncio (or per-call cancellable) wait checks for Stop
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+TRANSIENT_ERRORS = (
+    requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+    ProtocolError, ReadTimeoutError,  # Raised as-is when a body is read through response.raw
+    asyncio.TimeoutError, TimeoutError, ConnectionError,
+)
+if aiohttp is not None:
+    TRANSIENT_ERRORS += (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+
+def http_status(error):
+    """HTTP status of a requests or aiohttp error, or None if it isn't an HTTP error"""
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def classify(error):
+    """Return TRANSIENT or PERMANENT for an exception"""
+    status = http_status(error)
+    if status is not None:
+        return TRANSIENT if status in TRANSIENT_STATUS_CODES or status >= 500 else PERMANENT
+    return TRANSIENT if isinstance(error, TRANSIENT_ERRORS) else PERMANENT
+
+
+def describe(error):
+    """Short failure reason for logs and stats, e.g. 'HTTP 503' or 'ReadTimeout'"""
+    status = http_status(error)
+    if status is not None:
+        return f"HTTP {status}"
+    return type(error).__name__
+
+
+class RetryPolicy:
+    """Retries transient failures; permanent ones are re-raised straight away
+
+    The wait before retry n is drawn uniformly from [0, min(max_delay,
+    base_delay * 2**(n-1))] ("full jitter"), so workers that failed together
+    don't come back together. cancel() (Stop) ends pending waits and
+    suppresses further retries, and no retry is started that the current
+    patent's deadline (pdf_transfer) couldn't wait for. Counts are kept for
+    the run summary.
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self.retries = 0      # Retries made
+        self.recovered = 0    # Operations that succeeded after at least one retry
+        self.gave_up = 0      # Transient failures still failing after the last retry
+        self.reasons = Counter()  # Retries per failure reason
+
+    def delay(self, retry):
+        """Seconds to wait before the given retry (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (retry - 1)))
+        return random.uniform(0, ceiling)
+
+    def _next_delay(self, error, retry, cancel=None):
+        """Return the wait before retrying, or None to re-raise the error"""
+        if classify(error) == PERMANENT or self.cancel_event.is_set() or (cancel is not None and cancel.is_set()):
+            return None
+        wait = self.delay(retry)
+        deadline = current_deadline()
+        if retry > self.max_retries or (deadline and deadline.remaining() <= wait):
+            with self._lock:
+                self.gave_up += 1
+            return None
+        with self._lock:
+            self.retries += 1
+            self.reasons[describe(error)] += 1
+        return wait
+
+    def _succeeded(self, retry):
+        if retry > 1:
+            with self._lock:
+                self.recovered += 1
+
+    def call(self, func, on_retry=None, cancel=None):
+        """Call func() until it succeeds, fails permanently or runs out of retries
+
+        on_retry(retry, error, delay) is called before each wait. cancel is
+        an optional Event that, like cancel(), ends the wait and stops
+        retrying, but for this call only (e.g. a hedged attempt that lost).
+        """
+        retry = 1
+        while True:
+            try:
+                result = func()
+            except Exception as e:
+                wait = self._next_delay(e, retry, cancel)
+                if wait is None:
+                    raise
+                if on_retry:
+                    on_retry(retry, e, wait)
+                self._sleep(wait, cancel)
+                if cancel is not None and cancel.is_set():
+                    raise
+                retry += 1
+                continue
+            self._succeeded(retry)
+            return result
+
+    def _sleep(self, seconds, cancel=None):
+        """Wait that ends early on cancel() or once the per-call cancel Event is set"""
+        if cancel is None:
+            self.cancel_event.wait(seconds)
+            return
+        deadline = time.monotonic() + seconds
+        while not self.cancel_event.is_set() and not cancel.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            cancel.wait(min(remaining, CANCEL_POLL_INTERVAL))
+
+    async def call_async(self, func, on_retry=None):
+        """Asyncio version of call(); func() returns a coroutine"""
+        retry = 1
+        while True:
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                wait = self._next_delay(e, retry)
+                if wait is None:
+                    raise
+                if on_retry:
+                    on_retry(retry, e, wait)
+                await self._sleep_async(wait)
+                retry += 1
+                continue
+            self._succeeded(retry)
+            return result
+
+    async def _sleep_async(self, seconds):
+        """asyncio.sleep that ends early once cancelled"""
+        deadline = time.monotonic() + seconds
+        while not self.cancel_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, CANCEL_POLL_INTERVAL))
+
+    def cancel(self):
+        """Stop retrying and wake any waiting worker (used when the user presses Stop)"""
+        self.cancel_event.set()
+
+    def stats(self):
+        """Counts for the run summary"""
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'recovered': self.recovered,
+                'gave_up': self.gave_up,
+                'reasons': dict(self.reasons),
+            }